@@ -0,0 +1,74 @@
+import { AnalysisResult, Diagnostics, FraudRing, SuspiciousAccount } from './types';
+
+/**
+ * Reader for the engine's ndjson format (main.py --format ndjson).
+ *
+ * One JSON record per line, {"type": "account" | "ring" | "summary" |
+ * "diagnostics", ...fields}. NdjsonResultReader parses lines as chunks
+ * arrive, so the raw output is never held as one string.
+ */
+
+type NdjsonRecord =
+  | ({ type: 'account' } & SuspiciousAccount)
+  | ({ type: 'ring' } & FraudRing)
+  | ({ type: 'summary' } & AnalysisResult['summary'])
+  | ({ type: 'diagnostics' } & Diagnostics);
+
+export class NdjsonResultReader {
+  private partial: Buffer[] = [];
+  private accounts: SuspiciousAccount[] = [];
+  private rings: FraudRing[] = [];
+  private summary: AnalysisResult['summary'] | null = null;
+  private diagnostics: Diagnostics | null = null;
+
+  push(chunk: Buffer) {
+    let start = 0;
+    let newline = chunk.indexOf(0x0a, start);
+    while (newline !== -1) {
+      // Split on bytes, so multi-byte characters across chunks stay whole
+      this.partial.push(chunk.subarray(start, newline));
+      this.onLine(Buffer.concat(this.partial).toString('utf8'));
+      this.partial = [];
+      start = newline + 1;
+      newline = chunk.indexOf(0x0a, start);
+    }
+    if (start < chunk.length) {
+      this.partial.push(chunk.subarray(start));
+    }
+  }
+
+  finish(): AnalysisResult {
+    if (this.partial.length) {
+      this.onLine(Buffer.concat(this.partial).toString('utf8'));
+      this.partial = [];
+    }
+    if (!this.summary) {
+      throw new Error('NDJSON output ended without a summary record');
+    }
+    const result: AnalysisResult = {
+      suspicious_accounts: this.accounts,
+      fraud_rings: this.rings,
+      summary: this.summary,
+    };
+    if (this.diagnostics) {
+      result.diagnostics = this.diagnostics;
+    }
+    return result;
+  }
+
+  private onLine(line: string) {
+    if (!line.trim()) {
+      return;
+    }
+    const { type, ...fields } = JSON.parse(line) as NdjsonRecord;
+    if (type === 'account') {
+      this.accounts.push(fields as SuspiciousAccount);
+    } else if (type === 'ring') {
+      this.rings.push(fields as FraudRing);
+    } else if (type === 'summary') {
+      this.summary = fields as AnalysisResult['summary'];
+    } else if (type === 'diagnostics') {
+      this.diagnostics = fields as Diagnostics;
+    }
+  }
+}
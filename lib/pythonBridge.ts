@@ -1,36 +1,63 @@
-import { spawn } from 'child_process';
+import { spawn, ChildProcess } from 'child_process';
 import path from 'path';
 import { AnalysisResult } from './types';
+import { NdjsonResultReader } from './outputFormats';
 
-export async function analyzeCsv(csvPath: string): Promise<AnalysisResult> {
+// Use python3 for production environments (Render, etc.)
+function pythonCommand(): string {
+  return process.env.NODE_ENV === 'production' ? 'python3' : 'python';
+}
+
+// Set PYTHONPATH to include both the packages and the python-engine directory
+function pythonEnv(): NodeJS.ProcessEnv {
+  const pythonPath = process.env.NODE_ENV === 'production'
+    ? `${path.join(process.cwd(), '.python_packages')}:${path.join(process.cwd(), 'python-engine')}`
+    : path.join(process.cwd(), 'python-engine');
+
+  return {
+    ...process.env,
+    PYTHONPATH: pythonPath,
+  };
+}
+
+/**
+ * Run one analysis in a fresh `python main.py` process.
+ * Pays interpreter startup and imports on every call; used when the
+ * persistent engine is disabled or has died.
+ */
+export async function analyzeCsvWithSpawn(csvPath: string): Promise<AnalysisResult> {
   return new Promise((resolve, reject) => {
     const pythonScript = path.join(process.cwd(), 'python-engine', 'main.py');
-    // Use python3 for production environments (Render, etc.)
-    const pythonCommand = process.env.NODE_ENV === 'production' ? 'python3' : 'python';
-    
-    // Set PYTHONPATH to include both the packages and the python-engine directory
-    const pythonPath = process.env.NODE_ENV === 'production'
-      ? `${path.join(process.cwd(), '.python_packages')}:${path.join(process.cwd(), 'python-engine')}`
-      : path.join(process.cwd(), 'python-engine');
-    
-    const pythonProcess = spawn(pythonCommand, [pythonScript, csvPath], {
-      env: {
-        ...process.env,
-        PYTHONPATH: pythonPath,
-      },
-    });
-
-    let stdout = '';
+
+    const pythonProcess = spawn(pythonCommand(), [pythonScript, csvPath, '--format', 'ndjson'], {
+      env: pythonEnv(),
+    });
+
+    // Records are parsed line by line as they arrive, so the raw output
+    // is never held as one string
+    const reader = new NdjsonResultReader();
+    let parseError: unknown = null;
     let stderr = '';
 
-    pythonProcess.stdout.on('data', (data) => {
-      stdout += data.toString();
+    pythonProcess.stdout.on('data', (data: Buffer) => {
+      if (parseError) {
+        return;
+      }
+      try {
+        reader.push(data);
+      } catch (error) {
+        parseError = error;
+      }
     });
 
     pythonProcess.stderr.on('data', (data) => {
       stderr += data.toString();
     });
 
+    pythonProcess.on('error', (error) => {
+      reject(new Error(`Failed to start Python: ${error.message}`));
+    });
+
     pythonProcess.on('close', (code) => {
       if (code !== 0) {
         reject(new Error(`Python process exited with code ${code}: ${stderr}`));
@@ -38,11 +65,178 @@ export async function analyzeCsv(csvPath: string): Promise<AnalysisResult> {
       }
 
       try {
-        const result = JSON.parse(stdout);
-        resolve(result);
+        if (parseError) {
+          throw parseError;
+        }
+        resolve(reader.finish());
       } catch (error) {
         reject(new Error(`Failed to parse Python output: ${error}`));
       }
     });
   });
 }
+
+// Raised when the engine process itself fails, as opposed to a job error
+class EngineUnavailableError extends Error {}
+
+interface PendingJob {
+  resolve: (result: AnalysisResult) => void;
+  reject: (error: Error) => void;
+}
+
+/**
+ * One persistent `python server.py` process.
+ *
+ * Messages in both directions are frames: a 4-byte big-endian length
+ * followed by UTF-8 JSON. Jobs carry an id so replies can be matched.
+ */
+class EngineProcess {
+  private process: ChildProcess;
+  // Unconsumed stdout chunks; joined only once a whole frame has arrived
+  private chunks: Buffer[] = [];
+  private buffered = 0;
+  private pending = new Map<number, PendingJob>();
+  private nextId = 1;
+  private stderrTail = '';
+  alive = true;
+
+  constructor() {
+    const serverScript = path.join(process.cwd(), 'python-engine', 'server.py');
+    this.process = spawn(pythonCommand(), [serverScript], {
+      env: pythonEnv(),
+    });
+
+    this.process.stdout!.on('data', (data: Buffer) => this.onData(data));
+
+    this.process.stderr!.on('data', (data: Buffer) => {
+      // Keep the end of stderr for crash reports
+      this.stderrTail = (this.stderrTail + data.toString()).slice(-4000);
+    });
+
+    // A write after the engine died fails with EPIPE; unhandled, that error
+    // would crash the server instead of rejecting jobs so callers fall back
+    this.process.stdin!.on('error', (error) => this.fail(`Engine input closed: ${error.message}`));
+
+    this.process.on('error', (error) => this.fail(`Failed to start engine: ${error.message}`));
+    this.process.on('exit', (code) => this.fail(`Engine exited with code ${code}: ${this.stderrTail}`));
+  }
+
+  get load(): number {
+    return this.pending.size;
+  }
+
+  analyze(csvPath: string): Promise<AnalysisResult> {
+    if (!this.alive) {
+      return Promise.reject(new EngineUnavailableError('Engine is not running'));
+    }
+
+    const id = this.nextId++;
+    const payload = Buffer.from(JSON.stringify({ id, csv_path: csvPath }), 'utf8');
+    const header = Buffer.alloc(4);
+    header.writeUInt32BE(payload.length, 0);
+
+    return new Promise((resolve, reject) => {
+      this.pending.set(id, { resolve, reject });
+      this.process.stdin!.write(Buffer.concat([header, payload]), (error) => {
+        if (error) {
+          this.fail(`Failed to send job to engine: ${error.message}`);
+        }
+      });
+    });
+  }
+
+  private onData(data: Buffer) {
+    this.chunks.push(data);
+    this.buffered += data.length;
+
+    // Dispatch every complete frame; a partial frame waits for more data
+    while (this.buffered >= 4) {
+      if (this.chunks[0].length < 4) {
+        this.chunks = [Buffer.concat(this.chunks)];
+      }
+      const length = this.chunks[0].readUInt32BE(0);
+      if (this.buffered < 4 + length) {
+        break;
+      }
+      const buffer = this.chunks.length === 1 ? this.chunks[0] : Buffer.concat(this.chunks, this.buffered);
+      const payload = buffer.subarray(4, 4 + length).toString('utf8');
+      const rest = buffer.subarray(4 + length);
+      this.chunks = rest.length ? [rest] : [];
+      this.buffered = rest.length;
+      this.onMessage(JSON.parse(payload));
+    }
+  }
+
+  private onMessage(message: { id?: number; output?: AnalysisResult; error?: string }) {
+    // The startup "ready" frame has no job id
+    if (message.id === undefined || message.id === null) {
+      return;
+    }
+
+    const job = this.pending.get(message.id);
+    if (!job) {
+      return;
+    }
+    this.pending.delete(message.id);
+
+    if (message.error !== undefined) {
+      job.reject(new Error(`Analysis failed: ${message.error}`));
+    } else {
+      job.resolve(message.output as AnalysisResult);
+    }
+  }
+
+  private fail(reason: string) {
+    if (!this.alive) {
+      return;
+    }
+    this.alive = false;
+    this.process.kill();
+
+    const pending = Array.from(this.pending.values());
+    this.pending.clear();
+    for (const job of pending) {
+      job.reject(new EngineUnavailableError(reason));
+    }
+  }
+}
+
+// Number of persistent engines (MULERIFT_ENGINE_POOL, default 1).
+// Set MULERIFT_ENGINE=spawn to start a fresh process per request instead.
+const POOL_SIZE = Math.max(1, Number(process.env.MULERIFT_ENGINE_POOL) || 1);
+
+// Kept on globalThis so dev-mode module reloads reuse the running engines
+const globalPool = globalThis as typeof globalThis & { __muleriftEngines?: EngineProcess[] };
+
+function acquireEngine(): EngineProcess {
+  const engines = (globalPool.__muleriftEngines ??= []);
+
+  // Replace engines that died since the last request
+  for (let i = engines.length - 1; i >= 0; i--) {
+    if (!engines[i].alive) {
+      engines.splice(i, 1);
+    }
+  }
+  while (engines.length < POOL_SIZE) {
+    engines.push(new EngineProcess());
+  }
+
+  // Least busy engine first
+  return engines.reduce((best, engine) => (engine.load < best.load ? engine : best));
+}
+
+export async function analyzeCsv(csvPath: string): Promise<AnalysisResult> {
+  if (process.env.MULERIFT_ENGINE === 'spawn') {
+    return analyzeCsvWithSpawn(csvPath);
+  }
+
+  try {
+    return await acquireEngine().analyze(csvPath);
+  } catch (error) {
+    if (error instanceof EngineUnavailableError) {
+      console.error(`Persistent engine unavailable, spawning instead: ${error.message}`);
+      return analyzeCsvWithSpawn(csvPath);
+    }
+    throw error;
+  }
+}
@@ -23,6 +23,34 @@ export interface AnalysisResult {
     fraud_rings_detected: number;
     processing_time_seconds: number;
   };
+  // Only present when the engine ran with --diagnostics
+  diagnostics?: Diagnostics;
+}
+
+export interface DiagnosticsHotspot {
+  account_id: string;
+  expansions: number;
+  pruned: number;
+  seconds: number;
+  out_degree: number;
+  in_degree: number;
+  out_transactions: number;
+  in_transactions: number;
+}
+
+export interface DiagnosticsStage {
+  name: string;
+  calls: number;
+  wall_seconds: number;
+  cpu_seconds: number;
+  peak_memory_mb?: number;
+  counts: Record<string, number>;
+  hotspots?: DiagnosticsHotspot[];
+}
+
+export interface Diagnostics {
+  memory_traced: boolean;
+  stages: DiagnosticsStage[];
 }
 
 // Graph visualization types
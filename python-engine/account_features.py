@@ -0,0 +1,26 @@
+class AccountFeatures:
+    """
+    Per-account feature table: one numpy array per column, with rows in
+    sorted account_id order. Rows are addressed by integer id (the
+    EdgeStore ids); accounts is the id table, kept for output only.
+
+    Columns (see build_account_features):
+        txn_count, distinct_senders, distinct_receivers,
+        total_in, total_out, first_seen, last_seen
+    first_seen and last_seen are int64 epoch seconds, total_in and
+    total_out int64 cents.
+    """
+
+    def __init__(self, accounts, **columns):
+        self.accounts = accounts
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def take(self, column, ids):
+        """Values of one column for the given rows (e.g. store.ids), in that order."""
+        return self.columns[column][ids]
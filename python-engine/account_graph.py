@@ -0,0 +1,43 @@
+import numpy as np
+
+class AccountGraph:
+    """
+    Directed account graph over interned account ids.
+
+    Account ids are interned once at ingestion (graph_builder.intern_accounts)
+    into dense ranks in sorted account_id order, so the graph is just the
+    sender and receiver rank of every transaction plus a mask of the
+    accounts that are still nodes:
+
+        id_table[r]               -> account id of rank r (output only)
+        senders[t], receivers[t]  -> ranks of transaction t's accounts
+        active[r]                 -> rank r is a node (False once pruned)
+
+    Repeated transfers between the same pair form one edge, as they did in
+    the networkx DiGraph this replaces; sorting ranks gives the same order
+    as sorting the ids.
+    """
+
+    def __init__(self, id_table, senders, receivers):
+        self.id_table = id_table
+        self.senders = senders
+        self.receivers = receivers
+        self.active = np.ones(len(id_table), dtype=bool)
+
+    def nodes(self):
+        """Ranks of the remaining accounts, ascending."""
+        return np.flatnonzero(self.active)
+
+    def number_of_nodes(self):
+        return int(np.count_nonzero(self.active))
+
+    def edge_mask(self):
+        """Transactions whose sender and receiver are both nodes."""
+        return self.active[self.senders] & self.active[self.receivers]
+
+    def number_of_edges(self):
+        """Distinct sender -> receiver pairs between remaining accounts."""
+        keep = self.edge_mask()
+        stride = max(len(self.id_table), 1)
+        pairs = self.senders[keep].astype(np.int64) * stride + self.receivers[keep]
+        return len(np.unique(pairs))
@@ -0,0 +1,248 @@
+"""
+Scaling benchmark for the MuleRift pipeline.
+
+Sweeps generated datasets over sizes and graph shapes and measures every
+pipeline stage in-process: wall time, and peak traced memory (tracemalloc,
+which sees both Python objects and NumPy buffers). Results can be saved
+as a JSON baseline; a later run against that baseline exits with status
+1 when any stage got slower or bigger than the tolerance allows.
+
+    python benchmark_suite.py --sizes 10000 200000 --save-baseline base.json
+    python benchmark_suite.py --sizes 10000 200000 --baseline base.json
+
+Shapes:
+    sparse: uniformly random senders and receivers, ~3 transactions per account
+    hub_heavy: half of all transactions touch a small set of Zipf-weighted hubs
+    cycle_dense: accounts in small rings that pass money around in short
+                 bursts, plus random background traffic
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+
+from main import analyze, write_output
+from instrumentation import MB, Instrumentation
+
+SIZES = (10_000, 50_000, 200_000, 1_000_000, 2_000_000)
+SHAPES = ('sparse', 'hub_heavy', 'cycle_dense')
+
+# Regressions smaller than these are treated as noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.05
+MIN_REGRESSION_MB = 1.0
+
+def generate_dataset(path, num_rows, shape, seed=0):
+    """Write a synthetic transaction CSV of num_rows rows with the given shape."""
+    rng = np.random.default_rng(seed)
+    num_accounts = max(num_rows // 3, 16)
+    start = np.datetime64('2024-01-01T00:00:00', 's').astype(np.int64)
+    timestamps = start + rng.integers(0, 90 * 86400, num_rows)
+
+    if shape == 'sparse':
+        senders = rng.integers(0, num_accounts, num_rows)
+        receivers = rng.integers(0, num_accounts, num_rows)
+    elif shape == 'hub_heavy':
+        senders = rng.integers(0, num_accounts, num_rows)
+        receivers = rng.integers(0, num_accounts, num_rows)
+        num_hubs = max(num_accounts // 50, 1)
+        # Zipf-weighted hubs on one side of half the transactions
+        hubs = (rng.zipf(1.5, num_rows) - 1) % num_hubs
+        to_hub = rng.random(num_rows) < 0.25
+        from_hub = ~to_hub & (rng.random(num_rows) < 1 / 3)
+        receivers[to_hub] = hubs[to_hub]
+        senders[from_hub] = hubs[from_hub]
+    elif shape == 'cycle_dense':
+        ring_size = rng.integers(3, 6, num_accounts // 4 + 1)
+        ring_start = np.concatenate(([0], np.cumsum(ring_size)[:-1]))
+        ring = rng.integers(0, len(ring_size), num_rows)
+        position = rng.integers(0, ring_size[ring])
+        senders = ring_start[ring] + position
+        receivers = ring_start[ring] + (position + 1) % ring_size[ring]
+        # Each ring is active in a few bursts, so hops land inside the cycle window
+        burst = rng.integers(0, 4, num_rows)
+        timestamps = start + (ring * 7919 + burst * 20011) % (88 * 86400) + rng.integers(0, 48 * 3600, num_rows)
+        background = rng.random(num_rows) < 0.2
+        senders[background] = rng.integers(0, num_accounts, background.sum())
+        receivers[background] = rng.integers(0, num_accounts, background.sum())
+        senders %= num_accounts
+        receivers %= num_accounts
+    else:
+        raise ValueError(f"Unknown shape: {shape}")
+
+    receivers = np.where(senders == receivers, (receivers + 1) % num_accounts, receivers)
+    amounts = np.round(rng.uniform(10, 20000, num_rows), 2)
+    stamps = timestamps.astype('datetime64[s]').astype(str)
+
+    with open(path, 'w') as handle:
+        handle.write('transaction_id,sender_id,receiver_id,amount,timestamp\n')
+        handle.writelines(
+            f"TXN_{i:08d},ACC_{s:07d},ACC_{r:07d},{a:.2f},{t}\n"
+            for i, (s, r, a, t) in enumerate(zip(senders.tolist(), receivers.tolist(), amounts.tolist(), stamps))
+        )
+
+def dataset_path(data_dir, num_rows, shape, seed):
+    """Path of a generated dataset, created on first use and reused after."""
+    path = os.path.join(data_dir, f'{shape}-{num_rows}-{seed}.csv')
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        temp_path = path + '.tmp'
+        generate_dataset(temp_path, num_rows, shape, seed)
+        os.replace(temp_path, path)
+    return path
+
+def run_pipeline(csv_path, instrumentation):
+    """
+    Run the engine once on csv_path under instrumentation.
+
+    Calls main.analyze with the command line defaults, so every stage it
+    records (loading, pruning, each detector, ring grouping, output
+    assembly) is the one the engine runs, then serializes the output as
+    write_output does for the command line.
+    """
+    output, _ = analyze(csv_path, instrumentation=instrumentation)
+    output.pop("diagnostics", None)
+    with instrumentation.stage('write_output'):
+        write_output(output, io.StringIO())
+
+def benchmark_dataset(csv_path, repeat=1, memory=True):
+    """
+    Measure each stage on one dataset.
+
+    Times come from untraced runs (the best of repeat); peak memory from
+    one extra run under tracemalloc, whose overhead would skew the times.
+
+    Returns:
+        dict of stage name -> {"seconds": ..., "peak_mb": ...}
+    """
+    stages = {}
+
+    for _ in range(repeat):
+        instrumentation = Instrumentation(memory=False)
+        run_pipeline(csv_path, instrumentation)
+        for name, record in instrumentation.stages.items():
+            seconds = round(record.wall_seconds, 4)
+            entry = stages.setdefault(name, {})
+            entry['seconds'] = min(seconds, entry.get('seconds', seconds))
+
+    if memory:
+        instrumentation = Instrumentation(memory=True)
+        # Traced from out here, so analyze closing the instrumentation
+        # does not stop tracing before write_output
+        tracemalloc.start()
+        try:
+            run_pipeline(csv_path, instrumentation)
+        finally:
+            tracemalloc.stop()
+        for name, record in instrumentation.stages.items():
+            stages[name]['peak_mb'] = round(record.peak_memory_bytes / MB, 2)
+    return stages
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Find stages that regressed against the baseline.
+
+    A stage regresses when its time or peak memory exceeds the baseline
+    by more than tolerance (a fraction) and by more than the noise floor
+    (MIN_REGRESSION_SECONDS, MIN_REGRESSION_MB). Runs or stages missing
+    from the baseline are not compared.
+
+    Returns:
+        list of human-readable regression descriptions
+    """
+    regressions = []
+    for run_name, run in results['runs'].items():
+        base_run = baseline['runs'].get(run_name)
+        if base_run is None:
+            continue
+        for stage, entry in run['stages'].items():
+            base_entry = base_run['stages'].get(stage, {})
+            for metric, floor in (('seconds', MIN_REGRESSION_SECONDS), ('peak_mb', MIN_REGRESSION_MB)):
+                if metric not in entry or metric not in base_entry:
+                    continue
+                value, base_value = entry[metric], base_entry[metric]
+                if value > base_value * (1 + tolerance) and value - base_value > floor:
+                    regressions.append(
+                        f"{run_name} {stage}: {metric} {value} vs baseline {base_value} "
+                        f"(+{(value / base_value - 1) * 100 if base_value else float('inf'):.0f}%)"
+                    )
+    return regressions
+
+def print_run(run_name, stages):
+    """Print one dataset's stage table."""
+    print(f"\n{run_name}")
+    print(f"  {'stage':<24} {'seconds':>10} {'peak MB':>10}")
+    for stage, entry in stages.items():
+        peak = entry.get('peak_mb')
+        print(f"  {stage:<24} {entry['seconds']:>10.4f} {peak if peak is not None else '-':>10}")
+    total = sum(entry['seconds'] for entry in stages.values())
+    print(f"  {'total':<24} {total:>10.4f}")
+
+def parse_args(argv=None):
+    """Parse command line options for the benchmark suite."""
+    parser = argparse.ArgumentParser(description="MuleRift scaling benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help="Transaction counts to sweep")
+    parser.add_argument('--shapes', nargs='+', choices=SHAPES, default=list(SHAPES), help="Graph shapes to sweep")
+    parser.add_argument('--seed', type=int, default=0, help="Dataset generator seed")
+    parser.add_argument('--repeat', type=int, default=1, help="Timed runs per dataset; the fastest is kept")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc run for peak memory")
+    parser.add_argument(
+        '--data-dir',
+        default=os.path.join(tempfile.gettempdir(), 'mulerift-bench'),
+        help="Where generated datasets are cached"
+    )
+    parser.add_argument('--output', help="Write the results JSON here")
+    parser.add_argument('--save-baseline', metavar='PATH', help="Write the results as the new baseline")
+    parser.add_argument('--baseline', metavar='PATH', help="Compare against this baseline and fail on regressions")
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.25,
+        help="Allowed slowdown or memory growth per stage, as a fraction (0.25 = 25%%)"
+    )
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "runs": {}
+    }
+
+    for shape in args.shapes:
+        for num_rows in args.sizes:
+            csv_path = dataset_path(args.data_dir, num_rows, shape, args.seed)
+            run_name = f"{shape}-{num_rows}"
+            stages = benchmark_dataset(csv_path, repeat=args.repeat, memory=not args.no_memory)
+            results['runs'][run_name] = {"shape": shape, "rows": num_rows, "stages": stages}
+            print_run(run_name, stages)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as handle:
+                json.dump(results, handle, indent=2)
+                handle.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} stage regression(s) beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo stage regressed beyond {args.tolerance:.0%} of the baseline")
+
+if __name__ == "__main__":
+    main()
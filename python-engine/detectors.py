@@ -1,12 +1,58 @@
-import networkx as nx
-from datetime import timedelta
+import time
+import numpy as np
+import heapq
 from collections import defaultdict
-import pandas as pd
+from parallel import run_tasks, resolve_workers
+from instrumentation import DISABLED
 
-def detect_cycles(G, max_length=5, time_window_hours=72):
+def hop_windows(timestamps, window_seconds):
+    """
+    Window start times that keep at least one of these transactions in view.
+    
+    A transaction at time t fits in any window [start, start + window_seconds]
+    with t - window_seconds <= start <= t. The union over all (sorted)
+    timestamps of one sender->receiver hop is returned as merged intervals.
+    
+    Returns:
+        sorted list of disjoint (lo, hi) intervals of valid window starts
+    """
+    windows = []
+    for t in timestamps:
+        lo = t - window_seconds
+        if windows and lo <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], t)
+        else:
+            windows.append((lo, t))
+    return windows
+
+def intersect_windows(a, b):
+    """Intersect two sorted lists of disjoint (lo, hi) intervals."""
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        lo = max(a[i][0], b[j][0])
+        hi = min(a[i][1], b[j][1])
+        if lo <= hi:
+            result.append((lo, hi))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+def detect_cycles(store, max_length=5, time_window_hours=72, work=None):
     """
     Detect cycles where all transactions occur within 72 hours.
-    Optimized with depth-limited DFS to avoid exponential complexity.
+    
+    Johnson-style enumeration: every cycle is rooted at its smallest
+    account, and the search from a root only visits larger accounts, so
+    each cycle is found once and every account is covered. Each hop may
+    use any of the transfers between the pair; a partial path is pruned
+    as soon as no 72h window can contain one transfer of every hop.
+    
+    With a work dict, the search cost of every root is recorded as
+    work[root] = [expansions, pruned, seconds]: DFS calls, branches cut
+    by the time window, and wall time.
     
     Returns:
         cycle_nodes: set of nodes involved in cycles
@@ -16,241 +62,366 @@ def detect_cycles(G, max_length=5, time_window_hours=72):
     cycle_nodes = set()
     cycle_groups = []
     cycle_metadata = {}
-    seen_cycles = set()  # Deduplicate cycles
-    
-    def dfs_cycles(node, path, depth):
-        """DFS with depth limit to find cycles."""
-        if depth > max_length:
-            return
-        
-        for neighbor in G.successors(node):
-            if neighbor in path:
-                # Found a cycle
-                cycle_start_idx = path.index(neighbor)
-                cycle = path[cycle_start_idx:]
+    seen_cycles = set()  # Deduplicate cycles over the same accounts
+    window_seconds = time_window_hours * 3600
+    
+    # One entry per distinct successor, sorted by account index:
+    # (successor, valid window starts for that hop)
+    hops = []
+    for i in range(store.num_accounts):
+        outgoing = store.successors(i)
+        times_by_peer = defaultdict(list)
+        for peer, timestamp in zip(outgoing.peers.tolist(), outgoing.timestamps.tolist()):
+            times_by_peer[peer].append(timestamp)
+        hops.append([
+            (peer, hop_windows(times, window_seconds))
+            for peer, times in sorted(times_by_peer.items())
+            if peer != i
+        ])
+    
+    path = []
+    on_path = set()
+    expansions = 0
+    pruned = 0
+    
+    def dfs_cycles(node, windows):
+        """Extend the path from node; windows are the feasible window starts."""
+        nonlocal expansions, pruned
+        expansions += 1
+        root = path[0]
+        for neighbor, neighbor_windows in hops[node]:
+            if neighbor < root:
+                continue
+            
+            if neighbor == root:
+                if len(path) < 3:
+                    continue
+                if not intersect_windows(windows, neighbor_windows):
+                    continue
+                
+                normalized = frozenset(path)
+                if normalized in seen_cycles:
+                    continue
+                seen_cycles.add(normalized)
+                
+                cycle = [store.account_id(n) for n in path]
+                cycle_nodes.update(cycle)
+                cycle_groups.append(cycle)
+                for n in cycle:
+                    cycle_metadata[n] = f"cycle_length_{len(cycle)}"
+            elif neighbor not in on_path and len(path) < max_length:
+                # Prune as soon as the partial path breaks the time window
+                remaining = intersect_windows(windows, neighbor_windows)
+                if not remaining:
+                    pruned += 1
+                    continue
                 
-                if len(cycle) >= 3 and len(cycle) <= max_length:
-                    # Normalize cycle for deduplication (smallest node first)
-                    normalized = tuple(sorted(cycle))
-                    if normalized not in seen_cycles:
-                        # Check temporal constraint
-                        timestamps = []
-                        valid = True
-                        for i in range(len(cycle)):
-                            src = cycle[i]
-                            dst = cycle[(i + 1) % len(cycle)]
-                            if G.has_edge(src, dst):
-                                timestamps.append(G[src][dst]['timestamp'])
-                            else:
-                                valid = False
-                                break
-                        
-                        if valid and timestamps:
-                            time_span = max(timestamps) - min(timestamps)
-                            if time_span <= timedelta(hours=time_window_hours):
-                                seen_cycles.add(normalized)
-                                cycle_nodes.update(cycle)
-                                cycle_groups.append(list(cycle))
-                                for n in cycle:
-                                    cycle_metadata[n] = f"cycle_length_{len(cycle)}"
-            elif neighbor not in path:
-                dfs_cycles(neighbor, path + [neighbor], depth + 1)
-    
-    # Run DFS from each node (limit to avoid timeout)
-    # Sort nodes for deterministic iteration
-    sorted_nodes = sorted(G.nodes())
-    for node in sorted_nodes[:min(len(sorted_nodes), 1000)]:
-        dfs_cycles(node, [node], 1)
+                path.append(neighbor)
+                on_path.add(neighbor)
+                dfs_cycles(neighbor, remaining)
+                on_path.discard(neighbor)
+                path.pop()
+    
+    # Root the search at every account, in sorted order
+    for root in range(store.num_accounts):
+        if work is not None:
+            before = (expansions, pruned, time.perf_counter())
+        path.append(root)
+        on_path.add(root)
+        dfs_cycles(root, [(float('-inf'), float('inf'))])
+        on_path.discard(root)
+        path.pop()
+        if work is not None:
+            work[root] = [expansions - before[0], pruned - before[1], time.perf_counter() - before[2]]
     
     return cycle_nodes, cycle_groups, cycle_metadata
 
-def is_merchant(G, node, df, long_term_days=30):
+def merchant_accounts(store, features, long_term_days=30, min_senders=50):
     """
-    Check if a node is a legitimate merchant (long-term high-degree node).
+    Flag legitimate merchants (long-term high-degree nodes) for every account.
     
     Criteria:
-    - Consistent high volume over >30 days
-    - High in-degree (many unique senders)
-    """
-    # Get all transactions involving this node
-    node_txns = df[(df['sender_id'] == node) | (df['receiver_id'] == node)]
+    - Consistent high volume over >30 days (all transactions)
+    - High in-degree (>50 unique senders in the pruned graph)
     
-    if len(node_txns) == 0:
-        return False
+    Returns:
+        bool array aligned with the store's account indices
+    """
+    time_span = (features.take('last_seen', store.ids) - features.take('first_seen', store.ids)) // 86400
+    unique_senders = store.in_degrees()
+    return (time_span >= long_term_days) & (unique_senders > min_senders)
+
+def window_starts(offsets, timestamps, window_seconds):
+    """
+    Vectorized left edge of the time window ending at every transaction.
     
-    # Check time span
-    timestamps = pd.to_datetime(node_txns['timestamp'])
-    time_span = (timestamps.max() - timestamps.min()).days
+    offsets/timestamps are one side of the EdgeStore CSR layout, so edges
+    are sorted by (account, timestamp). For every edge j the result is the
+    first edge of the same account with timestamp >= timestamps[j] - window.
     
-    if time_span < long_term_days:
-        return False
+    Returns:
+        edge_account: account index of every edge
+        starts: window start position of every edge
+    """
+    num_accounts = len(offsets) - 1
+    edge_account = np.repeat(np.arange(num_accounts, dtype=np.int64), np.diff(offsets))
+    if len(timestamps) == 0:
+        return edge_account, np.zeros(0, dtype=np.int64)
+    
+    # Combined (account, time) key; the account stride exceeds any
+    # time difference plus the window, so searches never cross accounts
+    base_time = timestamps.min()
+    stride = int(timestamps.max() - base_time) + window_seconds + 1
+    keys = edge_account * stride + (timestamps - base_time)
+    starts = np.searchsorted(keys, keys - window_seconds, side='left')
+    return edge_account, starts
+
+def find_max_bursts(offsets, peers, timestamps, candidates, min_counterparties, window_seconds):
+    """
+    Find each candidate account's largest burst of distinct counterparties.
     
-    # Check if consistently high degree
-    in_degree = G.in_degree(node)
+    Window bounds for every edge come from one vectorized search. Accounts
+    whose busiest window has fewer than min_counterparties transactions
+    are dropped without a Python loop; the rest run a two-pointer scan
+    keeping a count per peer in the window.
     
-    # Merchant threshold: >50 unique senders over 30+ days
-    if in_degree > 50:
-        return True
+    Returns:
+        dict mapping account index to the distinct peers (in time order)
+        of its burst with the most counterparties (earliest on ties)
+    """
+    edge_account, starts = window_starts(offsets, timestamps, window_seconds)
+    
+    # Upper bound on distinct peers: transactions in the busiest window
+    busiest = np.zeros(len(offsets) - 1, dtype=np.int64)
+    np.maximum.at(busiest, edge_account, np.arange(len(starts)) - starts + 1)
+    candidates = candidates & (busiest >= min_counterparties)
+    
+    bursts = {}
+    for i in np.flatnonzero(candidates).tolist():
+        lo_edge, hi_edge = int(offsets[i]), int(offsets[i + 1])
+        segment_peers = peers[lo_edge:hi_edge].tolist()
+        segment_starts = (starts[lo_edge:hi_edge] - lo_edge).tolist()
+        
+        in_window = {}
+        left = 0
+        best_count, best_range = 0, (0, 0)
+        for right, peer in enumerate(segment_peers):
+            in_window[peer] = in_window.get(peer, 0) + 1
+            while left < segment_starts[right]:
+                left_peer = segment_peers[left]
+                if in_window[left_peer] == 1:
+                    del in_window[left_peer]
+                else:
+                    in_window[left_peer] -= 1
+                left += 1
+            if len(in_window) > best_count:
+                best_count, best_range = len(in_window), (left, right + 1)
+        
+        if best_count >= min_counterparties:
+            bursts[i] = list(dict.fromkeys(segment_peers[best_range[0]:best_range[1]]))
     
-    return False
+    return bursts
 
-def detect_smurfing_fan_in(G, df, min_senders=10, burst_window_hours=72, velocity_ratio=0.7):
+def find_fan_bursts(store, features, min_counterparties=10, burst_window_hours=72, velocity_ratio=0.7):
     """
-    Detect Fan-In (Aggregation) smurfing patterns.
-    Optimized with sorted transaction processing.
+    Find Fan-In (Aggregation) and Fan-Out (Dispersion) bursts.
+    
+    Both directions share one velocity-ratio check over the EdgeStore
+    totals and one sliding-window pass over the time-sorted incoming
+    (fan-in) and outgoing (fan-out) transactions.
     
     Criteria:
-    - unique_senders >= 10 within burst_window <= 72h
+    - unique counterparties >= 10 within burst_window <= 72h
     - velocity_ratio >= 0.7 (Total Out / Total In)
-    - Not a long-term merchant
+    - Fan-in collectors are not long-term merchants
     
     Returns:
-        smurfing_nodes: set of collector nodes
-        smurfing_groups: list of [collector + senders]
+        fan_in: dict mapping collector account_id to burst senders
+        fan_out: dict mapping disperser account_id to burst receivers
+    """
+    window_seconds = burst_window_hours * 3600
+    
+    total_in = store.total_in
+    total_out = store.total_out
+    ratio = np.divide(total_out, total_in, out=np.zeros(len(total_out)), where=total_in > 0)
+    passes_ratio = (total_in > 0) & (ratio >= velocity_ratio)
+    
+    fan_in_bursts = find_max_bursts(
+        store.in_offsets, store.in_peers, store.in_timestamps,
+        passes_ratio & ~merchant_accounts(store, features), min_counterparties, window_seconds
+    )
+    fan_out_bursts = find_max_bursts(
+        store.out_offsets, store.out_peers, store.out_timestamps,
+        passes_ratio, min_counterparties, window_seconds
+    )
+    
+    fan_in = {
+        store.account_id(i): [store.account_id(j) for j in burst]
+        for i, burst in fan_in_bursts.items()
+    }
+    fan_out = {
+        store.account_id(i): [store.account_id(j) for j in burst]
+        for i, burst in fan_out_bursts.items()
+    }
+    return fan_in, fan_out
+
+def smurfing_results(fan_in, fan_out):
+    """
+    Turn fan bursts into smurfing nodes, groups and metadata.
+    
+    Fan-in hubs are written first, then fan-out hubs, each in sorted
+    account order, so later hubs win when an account appears in several.
+    
+    Returns:
+        smurfing_nodes: set of collector and disperser nodes
+        smurfing_groups: list of [hub + counterparties in the largest burst]
         smurfing_metadata: dict mapping account_id to pattern description
     """
     smurfing_nodes = set()
     smurfing_groups = []
     smurfing_metadata = {}
     
-    # Sort nodes for deterministic iteration
-    for node in sorted(G.nodes()):
-        # Skip if merchant
-        if is_merchant(G, node, df):
-            continue
-        
-        # Get all incoming transactions
-        predecessors = list(G.predecessors(node))
-        
-        if len(predecessors) < min_senders:
-            continue
-        
-        # Collect and sort incoming transactions
-        incoming_txns = []
-        for pred in predecessors:
-            if G.has_edge(pred, node):
-                edge_data = G[pred][node]
-                incoming_txns.append({
-                    'sender': pred,
-                    'timestamp': edge_data['timestamp'],
-                    'amount': edge_data['amount']
-                })
-        
-        # Sort by timestamp
-        incoming_txns.sort(key=lambda x: x['timestamp'])
-        
-        # Use sliding window to check burst
-        found_burst = False
-        for i in range(len(incoming_txns) - min_senders + 1):
-            window_end = i + min_senders - 1
-            time_span = incoming_txns[window_end]['timestamp'] - incoming_txns[i]['timestamp']
-            
-            if time_span <= timedelta(hours=burst_window_hours):
-                # Calculate velocity ratio once
-                total_in = sum(G[pred][node]['amount'] for pred in predecessors)
-                total_out = sum(G[node][succ]['amount'] for succ in G.successors(node))
-                
-                if total_in > 0 and (total_out / total_in) >= velocity_ratio:
-                    smurfing_nodes.add(node)
-                    
-                    # Create ring: collector + senders in burst window
-                    burst_senders = [incoming_txns[j]['sender'] for j in range(i, window_end + 1)]
-                    ring_members = [node] + burst_senders
-                    smurfing_groups.append(ring_members)
-                    
-                    # Add metadata
-                    smurfing_metadata[node] = f"fan_in_{len(burst_senders)}_senders"
-                    for sender in burst_senders:
-                        smurfing_metadata[sender] = "fan_in_participant"
-                    
-                    found_burst = True
-                    break
-        
-        if found_burst:
-            continue
+    for node, burst_senders in sorted(fan_in.items()):
+        smurfing_nodes.add(node)
+        smurfing_groups.append([node] + burst_senders)
+        smurfing_metadata[node] = f"fan_in_{len(burst_senders)}_senders"
+        for sender in burst_senders:
+            smurfing_metadata[sender] = "fan_in_participant"
+    
+    for node, burst_receivers in sorted(fan_out.items()):
+        smurfing_nodes.add(node)
+        smurfing_groups.append([node] + burst_receivers)
+        smurfing_metadata[node] = f"fan_out_{len(burst_receivers)}_receivers"
+        for receiver in burst_receivers:
+            smurfing_metadata[receiver] = "fan_out_participant"
     
     return smurfing_nodes, smurfing_groups, smurfing_metadata
 
-def detect_smurfing_fan_out(G, df, min_receivers=10, burst_window_hours=72, velocity_ratio=0.7):
+def detect_smurfing(store, features, min_counterparties=10, burst_window_hours=72, velocity_ratio=0.7):
     """
-    Detect Fan-Out (Dispersion) smurfing patterns.
-    Optimized with sorted transaction processing.
-    
-    Criteria:
-    - unique_receivers >= 10 within burst_window <= 72h
-    - velocity_ratio >= 0.7 (Total Out / Total In)
+    Detect Fan-In and Fan-Out smurfing patterns (see find_fan_bursts).
     
     Returns:
-        smurfing_nodes: set of disperser nodes
-        smurfing_groups: list of [disperser + receivers]
+        smurfing_nodes: set of collector and disperser nodes
+        smurfing_groups: list of [hub + counterparties in the largest burst]
         smurfing_metadata: dict mapping account_id to pattern description
     """
-    smurfing_nodes = set()
-    smurfing_groups = []
-    smurfing_metadata = {}
+    fan_in, fan_out = find_fan_bursts(
+        store, features, min_counterparties, burst_window_hours, velocity_ratio
+    )
+    return smurfing_results(fan_in, fan_out)
+
+def pairwise_hold_hours(store, accounts):
+    """
+    Average receive-to-send delay over every (in, later out) pair, batched.
     
-    # Sort nodes for deterministic iteration
-    for node in sorted(G.nodes()):
-        # Get all outgoing transactions
-        successors = list(G.successors(node))
-        
-        if len(successors) < min_receivers:
-            continue
-        
-        # Collect and sort outgoing transactions
-        outgoing_txns = []
-        for succ in successors:
-            if G.has_edge(node, succ):
-                edge_data = G[node][succ]
-                outgoing_txns.append({
-                    'receiver': succ,
-                    'timestamp': edge_data['timestamp'],
-                    'amount': edge_data['amount']
-                })
+    For an outgoing transaction at time t, the k incoming transactions of
+    the same account before t contribute k * t - sum(their times). Both
+    come from one searchsorted over the time-sorted incoming edges plus a
+    prefix sum of their timestamps, so the cost is O((in + out) log in)
+    instead of O(in * out) per account.
+    
+    Returns:
+        float array of average delay in hours per account (NaN where an
+        account has no such pair or is not in accounts)
+    """
+    num_accounts = store.num_accounts
+    hold_hours = np.full(num_accounts, np.nan)
+    if store.num_edges == 0:
+        return hold_hours
+    
+    in_account = np.repeat(np.arange(num_accounts, dtype=np.int64), np.diff(store.in_offsets))
+    out_account = np.repeat(np.arange(num_accounts, dtype=np.int64), np.diff(store.out_offsets))
+    
+    # Combined (account, time) keys; see window_starts
+    base_time = min(store.in_timestamps.min(), store.out_timestamps.min())
+    in_times = store.in_timestamps - base_time
+    out_times = store.out_timestamps - base_time
+    stride = int(max(in_times.max(), out_times.max())) + 1
+    in_keys = in_account * stride + in_times
+    
+    selected = np.zeros(num_accounts, dtype=bool)
+    selected[accounts] = True
+    out_edges = np.flatnonzero(selected[out_account])
+    edge_account = out_account[out_edges]
+    edge_time = out_times[out_edges]
+    
+    # Incoming edges of the same account strictly before each send
+    position = np.searchsorted(in_keys, edge_account * stride + edge_time, side='left')
+    first_in = store.in_offsets[edge_account]
+    prefix = np.concatenate(([0], np.cumsum(in_times)))
+    pair_count = position - first_in
+    delay = pair_count * edge_time - (prefix[position] - prefix[first_in])
+    
+    total_pairs = np.bincount(edge_account, weights=pair_count, minlength=num_accounts)
+    total_delay = np.bincount(edge_account, weights=delay, minlength=num_accounts)
+    has_pairs = total_pairs > 0
+    hold_hours[has_pairs] = total_delay[has_pairs] / total_pairs[has_pairs] / 3600
+    return hold_hours
+
+def fifo_hold_hours(store, accounts):
+    """
+    Amount-weighted hold time with FIFO fund matching, batched.
+    
+    Each outgoing amount is matched against the earliest incoming funds
+    received before it that are not yet matched. Funds sent without
+    enough matched incoming balance are treated as coming from outside.
+    
+    Returns:
+        float array of average hold time in hours per account (NaN where
+        nothing was matched or the account is not in accounts)
+    """
+    hold_hours = np.full(store.num_accounts, np.nan)
+    
+    for i in accounts:
+        incoming = store.predecessors(i)
+        outgoing = store.successors(i)
+        in_amounts = incoming.amounts.tolist()
+        in_times = incoming.timestamps.tolist()
         
-        # Sort by timestamp
-        outgoing_txns.sort(key=lambda x: x['timestamp'])
+        # Cents and seconds, so the matching stays exact integer arithmetic
+        matched_amount = 0
+        weighted_delay = 0
+        head = 0         # earliest incoming transaction with funds left
+        available = 0    # incoming transactions received so far
+        remaining = in_amounts[:]
         
-        # Use sliding window to check burst
-        found_burst = False
-        for i in range(len(outgoing_txns) - min_receivers + 1):
-            window_end = i + min_receivers - 1
-            time_span = outgoing_txns[window_end]['timestamp'] - outgoing_txns[i]['timestamp']
-            
-            if time_span <= timedelta(hours=burst_window_hours):
-                # Calculate velocity ratio once
-                total_in = sum(G[pred][node]['amount'] for pred in G.predecessors(node))
-                total_out = sum(G[node][succ]['amount'] for succ in successors)
-                
-                if total_in > 0 and (total_out / total_in) >= velocity_ratio:
-                    smurfing_nodes.add(node)
-                    
-                    # Create ring: disperser + receivers in burst window
-                    burst_receivers = [outgoing_txns[j]['receiver'] for j in range(i, window_end + 1)]
-                    ring_members = [node] + burst_receivers
-                    smurfing_groups.append(ring_members)
-                    
-                    # Add metadata
-                    smurfing_metadata[node] = f"fan_out_{len(burst_receivers)}_receivers"
-                    for receiver in burst_receivers:
-                        smurfing_metadata[receiver] = "fan_out_participant"
-                    
-                    found_burst = True
-                    break
+        for out_amount, out_time in zip(outgoing.amounts.tolist(), outgoing.timestamps.tolist()):
+            while available < len(in_times) and in_times[available] < out_time:
+                available += 1
+            while out_amount > 0 and head < available:
+                take = min(out_amount, remaining[head])
+                matched_amount += take
+                weighted_delay += take * (out_time - in_times[head])
+                out_amount -= take
+                remaining[head] -= take
+                if remaining[head] <= 0:
+                    head += 1
         
-        if found_burst:
-            continue
+        if matched_amount > 0:
+            hold_hours[i] = weighted_delay / matched_amount / 3600
     
-    return smurfing_nodes, smurfing_groups, smurfing_metadata
+    return hold_hours
 
-def detect_velocity(G, pass_through_threshold=0.85, avg_time_hours=24):
+HOLD_TIME_MODES = {
+    'pairwise': pairwise_hold_hours,
+    'fifo': fifo_hold_hours
+}
+
+def detect_velocity(store, pass_through_threshold=0.85, avg_time_hours=24, hold_time_mode='pairwise'):
     """
     Detect high-velocity pass-through accounts.
+    Uses every transaction in the EdgeStore, not only the last transfer
+    per counterparty.
     
     Criteria:
     - pass_through_rate = total_out / total_in > 0.85
     - Average time between receive and send < 24 hours
     
+    hold_time_mode selects how the receive-to-send time is measured:
+    - 'pairwise': mean over every (receive, later send) pair
+    - 'fifo': amount-weighted, matching sends to the earliest unmatched funds
+    
     Returns:
         velocity_nodes: set of flagged nodes
         velocity_metadata: dict mapping account_id to pattern description
@@ -258,199 +429,290 @@ def detect_velocity(G, pass_through_threshold=0.85, avg_time_hours=24):
     velocity_nodes = set()
     velocity_metadata = {}
     
-    # Sort nodes for deterministic iteration
-    for node in sorted(G.nodes()):
-        # Calculate total in and out
-        total_in = sum(G[pred][node]['amount'] for pred in G.predecessors(node))
-        total_out = sum(G[node][succ]['amount'] for succ in G.successors(node))
-        
-        if total_in == 0:
-            continue
-        
-        pass_through_rate = total_out / total_in
-        
-        if pass_through_rate <= pass_through_threshold:
-            continue
-        
-        # Calculate average time between receive and send
-        in_times = [G[pred][node]['timestamp'] for pred in G.predecessors(node)]
-        out_times = [G[node][succ]['timestamp'] for succ in G.successors(node)]
-        
-        if not in_times or not out_times:
-            continue
-        
-        # Average time from first receive to first send
-        time_diffs = []
-        for in_time in in_times:
-            for out_time in out_times:
-                if out_time > in_time:
-                    time_diffs.append((out_time - in_time).total_seconds() / 3600)
-        
-        if time_diffs:
-            avg_time = sum(time_diffs) / len(time_diffs)
-            if avg_time < avg_time_hours:
-                velocity_nodes.add(node)
-                velocity_metadata[node] = "high_velocity"
+    total_in = store.total_in
+    total_out = store.total_out
+    pass_through_rate = np.divide(total_out, total_in, out=np.zeros(len(total_out)), where=total_in > 0)
+    candidates = np.flatnonzero((total_in > 0) & (pass_through_rate > pass_through_threshold))
+    
+    hold_hours = HOLD_TIME_MODES[hold_time_mode](store, candidates)
+    
+    # NaN (no receive-then-send pair) never compares below the threshold
+    for i in np.flatnonzero(hold_hours < avg_time_hours).tolist():
+        node = store.account_id(i)
+        velocity_nodes.add(node)
+        velocity_metadata[node] = "high_velocity"
     
     return velocity_nodes, velocity_metadata
 
-def is_ghost_account(G, node, df, max_transactions=3):
+def ghost_accounts(store, features, max_transactions=3):
     """
-    Check if an account is a 'Ghost Account' (shell with no outside life).
+    Flag 'Ghost Accounts' (shells with no outside life) for every account.
     
     Criteria:
-    - total_transactions <= 3
-    - Not active outside detected chains
+    - total_transactions <= 3 (counted over all data, before pruning)
     
-    Returns True if account is a ghost (potential shell)
+    Returns:
+        bool array aligned with the store's account indices
     """
-    # Count total transactions involving this node
-    node_txns = df[(df['sender_id'] == node) | (df['receiver_id'] == node)]
-    total_transactions = len(node_txns)
-    
-    # Ghost accounts have very few transactions
-    if total_transactions > max_transactions:
-        return False
-    
-    return True
+    return features.take('txn_count', store.ids) <= max_transactions
 
-def calculate_intermediate_velocity(G, node):
+def intermediate_velocity_hours(store):
     """
-    Calculate velocity window for intermediate node.
+    Calculate velocity window for every account at once.
     
-    velocity_window = outgoing_time - incoming_time
+    velocity_window = first outgoing_time - first incoming_time
     
-    Returns average velocity in hours
+    Returns:
+        float array of velocity in hours (0 if the first send is not after
+        the first receive, NaN if the account never receives or never sends)
     """
-    in_times = [G[pred][node]['timestamp'] for pred in G.predecessors(node)]
-    out_times = [G[node][succ]['timestamp'] for succ in G.successors(node)]
-    
-    if not in_times or not out_times:
-        return None
-    
-    # Calculate time between first incoming and first outgoing
-    min_in = min(in_times)
-    min_out = min(out_times)
-    
-    if min_out <= min_in:
-        return 0
-    
-    velocity_hours = (min_out - min_in).total_seconds() / 3600
-    return velocity_hours
+    velocity = np.full(store.num_accounts, np.nan)
+    has_in = np.diff(store.in_offsets) > 0
+    has_out = np.diff(store.out_offsets) > 0
+    both = np.flatnonzero(has_in & has_out)
+    
+    # Edges are time-sorted per account, so the first edge is the earliest
+    first_in = store.in_timestamps[store.in_offsets[both]]
+    first_out = store.out_timestamps[store.out_offsets[both]]
+    velocity[both] = np.maximum(first_out - first_in, 0) / 3600
+    return velocity
 
-def detect_peel_chains(G, df, min_length=3, time_window_hours=72, max_velocity_hours=24):
+def detect_peel_chains(store, features, min_length=3, max_length=6, time_window_hours=72, max_velocity_hours=24,
+                       work=None):
     """
     Detect shell/layering chains with strict temporal and behavioral criteria.
-    Optimized with degree-based filtering and limited path search.
+    
+    Dynamic program over every transaction in timestamp order. Every
+    distinct account path ending at a transaction is kept, with the latest
+    start time it can have (a later start only widens what fits in the
+    window), and a new transaction u -> v extends the chains ending at an
+    earlier transaction into u. Ghost intermediates have at most three
+    transactions, so a relay has at most two incoming edges and each
+    transaction carries a bounded number of paths. Every source is
+    covered and the cost grows with the number of edges.
     
     Refined Criteria:
-    1. Temporal Chain: max_timestamp - min_timestamp <= 72h
+    1. Temporal Chain: hops in time order, last - first timestamp <= 72h
     2. Intermediate Velocity: velocity_window <= 24h (funds pass quickly)
     3. Ghost Account Filter: total_transactions <= 3, no outside life
     4. Strict amount decay (each hop < previous)
+    5. Sources have 1-5 distinct receivers; chains span 3-6 accounts
+    
+    With a work dict, the cost of extending chains through each relay
+    account u is recorded as work[u] = [expansions, pruned, seconds]:
+    chains extended through u, chains into u rejected by the amount,
+    time, length or repeat checks, and wall time.
     
     Returns:
         peel_nodes: set of nodes in valid shell chains
-        peel_groups: list of valid shell chain paths
+        peel_groups: list of maximal shell chain paths
         peel_metadata: dict mapping account_id to pattern description
     """
     peel_nodes = set()
     peel_groups = []
     peel_metadata = {}
-    
-    # Precompute ghost accounts (low degree nodes)
-    ghost_accounts = set()
-    for node in G.nodes():
-        if is_ghost_account(G, node, df):
-            ghost_accounts.add(node)
-    
-    # Only search from nodes with potential shell patterns
-    # (nodes with low-medium degree that could be part of chains)
-    candidate_sources = sorted([n for n in G.nodes() if G.out_degree(n) > 0 and G.out_degree(n) <= 5])
-    
-    # Limit search to avoid timeout
-    max_sources = min(len(candidate_sources), 500)
-    
-    def dfs_shell_chain(node, path, amounts, timestamps, depth):
-        """DFS to find shell chains with depth limit."""
-        if depth > 6:  # Limit depth
-            return
+    window_seconds = time_window_hours * 3600
+    max_hops = max_length - 1
+    
+    # Precompute ghost accounts (low transaction count nodes)
+    is_ghost = ghost_accounts(store, features)
+    
+    # Velocity is checked once per node instead of on every visit
+    velocity = intermediate_velocity_hours(store)
+    can_relay = is_ghost & ~(velocity > max_velocity_hours)
+    
+    out_degree = store.out_degrees()
+    is_source = (out_degree > 0) & (out_degree <= 5)
+    
+    # Every transaction, in (timestamp, txn_index) order
+    senders = np.repeat(np.arange(store.num_accounts), np.diff(store.out_offsets))
+    order = np.lexsort((store.out_txn_index, store.out_timestamps))
+    senders = senders[order].tolist()
+    receivers = store.out_peers[order].tolist()
+    amounts = store.out_amounts[order].tolist()
+    timestamps = store.out_timestamps[order].tolist()
+    can_relay = can_relay.tolist()
+    is_source = is_source.tolist()
+    
+    # chains[e] = {path before the receiver: latest start_time} for chains
+    # ending with edge e, only kept when the receiver can relay further
+    chains = {}
+    ending_at = defaultdict(list)  # relay account -> edges into it with chains
+    finished = []                  # (edge, path) for chains of >= min_length accounts
+    extended = set()               # (edge, path) that a later edge extended
+    
+    for e in range(len(senders)):
+        u, v = senders[e], receivers[e]
+        amount, timestamp = amounts[e], timestamps[e]
         
-        if len(path) >= min_length:
-            # Check if this is a valid shell chain
-            time_span = max(timestamps) - min(timestamps)
-            if time_span <= timedelta(hours=time_window_hours):
-                # Check intermediate nodes are ghosts
-                valid = True
-                for i in range(1, len(path) - 1):
-                    if path[i] not in ghost_accounts:
-                        valid = False
-                        break
-                
-                if valid:
-                    peel_nodes.update(path)
-                    peel_groups.append(list(path))
-                    for n in path:
-                        peel_metadata[n] = f"shell_hop_{len(path)}"
+        if u == v:
+            continue
         
-        # Continue DFS
-        for neighbor in G.successors(node):
-            if neighbor not in path:
-                edge_data = G[node][neighbor]
-                amount = edge_data['amount']
-                timestamp = edge_data['timestamp']
-                
+        # path before v -> [start_time, extended (edge, path) states]
+        current = {}
+        if is_source[u]:
+            current[(u,)] = [timestamp, []]
+        
+        if can_relay[u]:
+            if work is not None:
+                started = time.perf_counter()
+            expansions = pruned = 0
+            for p in ending_at[u]:
                 # Check amount decay
-                if amounts and amount >= amounts[-1]:
+                if amount >= amounts[p]:
+                    pruned += len(chains[p])
                     continue
-                
-                # Check velocity for intermediate nodes
-                if len(path) > 1:
-                    velocity = calculate_intermediate_velocity(G, node)
-                    if velocity is not None and velocity > max_velocity_hours:
+                for path, start in chains[p].items():
+                    if len(path) >= max_hops or timestamp - start > window_seconds or v in path:
+                        pruned += 1
                         continue
-                
-                dfs_shell_chain(
-                    neighbor,
-                    path + [neighbor],
-                    amounts + [amount],
-                    timestamps + [timestamp],
-                    depth + 1
-                )
-    
-    # Run limited DFS from candidate sources
-    for source in candidate_sources[:max_sources]:
-        for neighbor in G.successors(source):
-            edge_data = G[source][neighbor]
-            dfs_shell_chain(
-                neighbor,
-                [source, neighbor],
-                [edge_data['amount']],
-                [edge_data['timestamp']],
-                2
-            )
+                    expansions += 1
+                    entry = current.setdefault(path + (u,), [start, []])
+                    entry[0] = max(entry[0], start)
+                    entry[1].append((p, path))
+            if work is not None:
+                counters = work.setdefault(u, [0, 0, 0.0])
+                counters[0] += expansions
+                counters[1] += pruned
+                counters[2] += time.perf_counter() - started
+        
+        for path, (start, origins) in current.items():
+            extended.update(origins)
+            if len(path) + 1 >= min_length:
+                finished.append((e, path))
+        
+        if current and can_relay[v]:
+            chains[e] = {path: start for path, (start, _) in current.items()}
+            ending_at[v].append(e)
+    
+    # Report maximal chains only, each account path once; nodes in several
+    # keep the longest length
+    longest = {}
+    reported = set()
+    for e, path in finished:
+        if (e, path) in extended:
+            continue
+        path += (receivers[e],)
+        if path in reported:
+            continue
+        reported.add(path)
+        chain = [store.account_id(n) for n in path]
+        peel_nodes.update(chain)
+        peel_groups.append(chain)
+        for n in chain:
+            if len(chain) > longest.get(n, 0):
+                longest[n] = len(chain)
+                peel_metadata[n] = f"shell_hop_{len(chain)}"
     
     return peel_nodes, peel_groups, peel_metadata
 
-def detect_all_patterns(G, df):
+# Detector stages in the order their results are merged
+DETECTOR_STAGES = ('cycles', 'smurfing', 'velocity', 'shell')
+
+# Instrumentation stage name of each detector stage
+DETECTOR_FUNCTIONS = {
+    'cycles': 'detect_cycles',
+    'smurfing': 'detect_smurfing',
+    'velocity': 'detect_velocity',
+    'shell': 'detect_peel_chains'
+}
+
+def run_detector(shared, stage):
     """
-    Run all detection algorithms on the graph.
+    Run one detector stage on the shared inputs.
+    
+    shared holds the store, features, hold_time_mode and optionally an
+    instrumentation; this is the task function handed to
+    parallel.run_tasks.
+    """
+    if stage not in DETECTOR_FUNCTIONS:
+        raise ValueError(f"Unknown detector stage: {stage}")
+    store = shared['store']
+    features = shared['features']
+    instrumentation = shared.get('instrumentation', DISABLED)
+    
+    # Per-account search cost, for the detectors that explore paths
+    work = {} if instrumentation.hotspots and stage in ('cycles', 'shell') else None
+    
+    with instrumentation.stage(DETECTOR_FUNCTIONS[stage]) as record:
+        if stage == 'cycles':
+            result = detect_cycles(store, work=work)
+        elif stage == 'smurfing':
+            result = detect_smurfing(store, features)
+        elif stage == 'velocity':
+            result = detect_velocity(store, hold_time_mode=shared['hold_time_mode'])
+        else:
+            result = detect_peel_chains(store, features, work=work)
+        
+        record.count(accounts=store.num_accounts, edges=store.num_edges, flagged=len(result[0]))
+        if len(result) == 3:
+            record.count(groups=len(result[1]))
+        if work:
+            record.count(expansions=sum(c[0] for c in work.values()), pruned=sum(c[1] for c in work.values()))
+            record.add_hotspots(hotspot_entries(store, work, instrumentation.hotspots))
+    return result
+
+def hotspot_entries(store, work, top_n):
+    """
+    The top_n most expensive accounts of a detector's work counters.
+    
+    Ranked by expansions plus pruned branches, which unlike wall time
+    does not depend on machine load, then by time.
     
     Returns:
-        Dictionary with all detection results including metadata
+        list of dicts with the account id, its counters and degree stats
+        (distinct and transaction in/out degrees), most expensive first
     """
-    cycle_nodes, cycle_groups, cycle_metadata = detect_cycles(G)
+    ranked = sorted(work.items(), key=lambda item: (-(item[1][0] + item[1][1]), -item[1][2], item[0]))[:top_n]
+    indices = np.array([i for i, _ in ranked], dtype=np.int64)
+    out_degrees = store.out_degrees()[indices].tolist()
+    in_degrees = store.in_degrees()[indices].tolist()
+    out_transactions = (store.out_offsets[indices + 1] - store.out_offsets[indices]).tolist()
+    in_transactions = (store.in_offsets[indices + 1] - store.in_offsets[indices]).tolist()
+    
+    return [
+        {
+            "account_id": store.account_id(i),
+            "expansions": expansions,
+            "pruned": pruned,
+            "seconds": round(seconds, 6),
+            "out_degree": out_degrees[k],
+            "in_degree": in_degrees[k],
+            "out_transactions": out_transactions[k],
+            "in_transactions": in_transactions[k]
+        }
+        for k, (i, (expansions, pruned, seconds)) in enumerate(ranked)
+    ]
+
+def detect_all_patterns(store, features, hold_time_mode='pairwise', workers=1, instrumentation=DISABLED):
+    """
+    Run all detection algorithms on the graph.
     
-    smurfing_fan_in_nodes, smurfing_fan_in_groups, smurfing_fan_in_metadata = detect_smurfing_fan_in(G, df)
-    smurfing_fan_out_nodes, smurfing_fan_out_groups, smurfing_fan_out_metadata = detect_smurfing_fan_out(G, df)
+    store is the EdgeStore holding every transaction between the accounts
+    left after pruning, features the account feature table from
+    build_account_features. hold_time_mode is passed to detect_velocity.
     
-    # Merge smurfing results
-    smurfing_nodes = smurfing_fan_in_nodes | smurfing_fan_out_nodes
-    smurfing_groups = smurfing_fan_in_groups + smurfing_fan_out_groups
-    smurfing_metadata = {**smurfing_fan_in_metadata, **smurfing_fan_out_metadata}
+    With workers > 1 the detectors run concurrently in a forked process
+    pool that shares store and features read-only. Results are merged in
+    DETECTOR_STAGES order, so the output is identical to a sequential run.
     
-    velocity_nodes, velocity_metadata = detect_velocity(G)
-    peel_nodes, peel_groups, peel_metadata = detect_peel_chains(G, df)
+    Each detector is recorded as its own instrumentation stage.
+    
+    Returns:
+        Dictionary with all detection results including metadata
+    """
+    shared = {
+        'store': store,
+        'features': features,
+        'hold_time_mode': hold_time_mode,
+        'instrumentation': instrumentation
+    }
+    (
+        (cycle_nodes, cycle_groups, cycle_metadata),
+        (smurfing_nodes, smurfing_groups, smurfing_metadata),
+        (velocity_nodes, velocity_metadata),
+        (peel_nodes, peel_groups, peel_metadata)
+    ) = run_tasks(run_detector, DETECTOR_STAGES, shared, workers, instrumentation)
     
     return {
         "cycle_nodes": cycle_nodes,
@@ -465,3 +727,116 @@ def detect_all_patterns(G, df):
         "shell_groups": peel_groups,
         "shell_metadata": peel_metadata
     }
+
+def pack_work_units(store, num_units):
+    """
+    Pack weakly connected components into balanced work units.
+    
+    Every pattern (cycle, fan, shell chain) lies inside one weakly
+    connected component, so components can be analyzed independently.
+    Components are assigned largest first (by edge count) to the unit with
+    the fewest edges so far. Components without edges cannot hold a
+    pattern and are skipped. A single giant component still ends up in
+    one unit.
+    
+    Returns:
+        list of sorted account index arrays, one per non-empty unit
+    """
+    labels = store.weak_components()
+    edge_counts = np.bincount(labels, weights=np.diff(store.out_offsets), minlength=store.num_accounts).astype(np.int64)
+    roots = np.flatnonzero(edge_counts)
+    
+    # Largest component first, ties broken by smallest account
+    roots = roots[np.lexsort((roots, -edge_counts[roots]))]
+    unit_of_root = np.full(store.num_accounts, -1, dtype=np.int64)
+    loads = [(0, unit) for unit in range(num_units)]
+    for root in roots.tolist():
+        load, unit = heapq.heappop(loads)
+        unit_of_root[root] = unit
+        heapq.heappush(loads, (load + int(edge_counts[root]), unit))
+    
+    unit_of_account = unit_of_root[labels]
+    units = [np.flatnonzero(unit_of_account == unit) for unit in range(num_units)]
+    return [unit for unit in units if len(unit)]
+
+def run_work_unit(shared, unit):
+    """Run the full detector suite on one work unit (task for run_tasks)."""
+    instrumentation = shared['instrumentation']
+    with instrumentation.stage('edge_store_subset') as record:
+        store = shared['store'].subset(shared['units'][unit])
+        record.count(accounts=store.num_accounts, edges=store.num_edges)
+    return detect_all_patterns(
+        store,
+        shared['features'],
+        hold_time_mode=shared['hold_time_mode'],
+        instrumentation=instrumentation
+    )
+
+def merge_results(partials):
+    """
+    Merge detect_all_patterns results from disjoint work units.
+    
+    Units are merged in order: sets are unioned, group lists concatenated
+    and metadata dicts updated. Units share no accounts, so no metadata
+    entry is overwritten.
+    """
+    merged = {}
+    for partial in partials:
+        for key, value in partial.items():
+            if key not in merged:
+                merged[key] = type(value)()
+            if isinstance(value, set):
+                merged[key] |= value
+            elif isinstance(value, list):
+                merged[key].extend(value)
+            else:
+                merged[key].update(value)
+    return merged
+
+def detect_all_patterns_by_component(store, features, hold_time_mode='pairwise', workers=1, max_unit_edges=None,
+                                     instrumentation=DISABLED):
+    """
+    Run all detection algorithms per connected-component work unit.
+    
+    The pruned graph is split into weakly connected components, packed
+    into one balanced unit per worker, and each unit runs the full
+    detector suite in a forked process pool. Results are merged in unit
+    order; ring grouping sorts everything afterwards, so the final output
+    matches detect_all_patterns.
+    
+    max_unit_edges caps the edges per unit to bound peak memory: more
+    units are packed than workers when needed, and each is copied out of
+    the (possibly memory-mapped) store only while it runs. A single
+    component larger than the cap still forms one unit.
+    
+    Returns:
+        Dictionary with all detection results including metadata
+    """
+    workers = resolve_workers(workers)
+    num_units = workers
+    if max_unit_edges:
+        num_units = max(workers, -(-store.num_edges // max_unit_edges))
+    if num_units <= 1:
+        return detect_all_patterns(store, features, hold_time_mode=hold_time_mode, instrumentation=instrumentation)
+    
+    with instrumentation.stage('pack_work_units') as record:
+        units = pack_work_units(store, num_units)
+        record.count(units=len(units))
+    if not units or (len(units) == 1 and not max_unit_edges):
+        return detect_all_patterns(
+            store,
+            features,
+            hold_time_mode=hold_time_mode,
+            workers=workers,
+            instrumentation=instrumentation
+        )
+    
+    shared = {
+        'store': store,
+        'features': features,
+        'hold_time_mode': hold_time_mode,
+        'units': units,
+        'instrumentation': instrumentation
+    }
+    partials = run_tasks(run_work_unit, list(range(len(units))), shared, workers, instrumentation)
+    return merge_results(partials)
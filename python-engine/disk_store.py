@@ -0,0 +1,359 @@
+"""
+Out-of-core EdgeStore for transaction exports larger than RAM.
+
+The CSV is streamed in chunks into flat column files, then sorted into
+the EdgeStore CSR layout with a two-pass counting sort written straight
+into memory-mapped .npy files. Only per-account arrays (offsets, ranks,
+features) and one chunk of edges are held in memory at a time; the
+DataFrame and the AccountGraph are never built.
+"""
+import os
+import re
+import numpy as np
+from edge_store import EdgeStore
+from account_features import AccountFeatures
+from graph_builder import iter_transaction_chunks
+
+DEFAULT_MEMORY_BUDGET_MB = 1024
+
+# Rough peak bytes per CSV row while a pandas chunk is parsed and
+# converted, and per edge while the detectors run on a work unit
+CSV_BYTES_PER_ROW = 1024
+DETECTION_BYTES_PER_EDGE = 1024
+
+# Account id tokens pd.read_csv types as int64 or float64 when a whole
+# column matches; anything else makes the column text
+INTEGER_ID = re.compile(r'\s*[+-]?\d+\s*')
+FLOAT_ID = re.compile(r'\s*[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?\s*')
+ID_KINDS = (int, float, str)
+
+EDGE_COLUMNS = (('peers', np.int32), ('amounts', np.int64), ('timestamps', np.int64), ('txn_index', np.int64))
+
+def chunk_rows(memory_budget_mb):
+    """Rows per CSV chunk and per sort block that fit the memory budget."""
+    return max(1024, int(memory_budget_mb * 1024 * 1024) // CSV_BYTES_PER_ROW)
+
+def max_unit_edges(memory_budget_mb):
+    """Edges per detection work unit that fit the memory budget."""
+    return max(1024, int(memory_budget_mb * 1024 * 1024) // DETECTION_BYTES_PER_EDGE)
+
+def build_disk_store(csv_path, store_dir, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, time_range=None):
+    """
+    Build the pruned EdgeStore and feature table for csv_path on disk.
+
+    1. Stream the file in chunks (iter_transaction_chunks, CSV, Parquet or
+       Arrow IPC, within time_range); intern account ids to integers and append
+       sender, receiver, amount and epoch timestamp to raw column files.
+    2. Accumulate the account features chunk by chunk.
+    3. Counting-sort the raw edges by sender and by receiver into mmap CSR
+       files, then sort each account's edges by (timestamp, txn_index)
+       block by block; distinct counterparties are counted on the way.
+    4. Prune accounts without both incoming and outgoing transactions and
+       copy the CSR runs of the kept accounts into the final store files.
+
+    Files in store_dir are rebuilt on every run. The result matches
+    build_edge_store and build_account_features on the same CSV.
+
+    Returns:
+        store: EdgeStore over read-only memory-mapped arrays
+        features: AccountFeatures for every account in the CSV
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    rows = chunk_rows(memory_budget_mb)
+
+    account_ids, raw_account, raw, raw_paths = _stream_raw_columns(csv_path, store_dir, rows, time_range)
+    num_accounts = len(account_ids)
+
+    # Rank accounts in sorted id order, as the in-memory store does; raw
+    # indices of the same account share its rank
+    order = sorted(range(num_accounts), key=account_ids.__getitem__)
+    accounts = [account_ids[i] for i in order]
+    rank = np.empty(num_accounts, dtype=np.int64)
+    rank[order] = np.arange(num_accounts)
+    rank = rank[raw_account]
+
+    columns = _accumulate_features(raw, rank, num_accounts, rows)
+
+    # Sort every edge by sender and by receiver, counting distinct peers
+    full_out, columns['distinct_receivers'], columns['total_out'] = _counting_sort(
+        raw, 'senders', 'receivers', rank, num_accounts, os.path.join(store_dir, 'full_out'), rows
+    )
+    full_in, columns['distinct_senders'], columns['total_in'] = _counting_sort(
+        raw, 'receivers', 'senders', rank, num_accounts, os.path.join(store_dir, 'full_in'), rows
+    )
+    features = AccountFeatures(accounts, **columns)
+
+    # Prune like prune_isolated_nodes: keep accounts that send and receive
+    keep = (np.diff(full_out[0]) > 0) & (np.diff(full_in[0]) > 0)
+    new_index = np.cumsum(keep) - 1
+
+    out_arrays, total_out = _filter_csr(full_out, keep, new_index, os.path.join(store_dir, 'out'), rows)
+    in_arrays, total_in = _filter_csr(full_in, keep, new_index, os.path.join(store_dir, 'in'), rows)
+
+    # Intermediate files are no longer needed once the final ones exist
+    del raw
+    for path in raw_paths:
+        os.remove(path)
+    for prefix in ('full_out', 'full_in'):
+        for name, _ in EDGE_COLUMNS:
+            os.remove(os.path.join(store_dir, f'{prefix}_{name}.npy'))
+    del full_out, full_in
+
+    store = EdgeStore.from_csr(accounts, np.flatnonzero(keep), out_arrays, in_arrays, total_in, total_out)
+    return store, features
+
+def _stream_raw_columns(csv_path, store_dir, rows, time_range=None):
+    """
+    Stream the transaction file into raw column files in arrival order.
+
+    Account ids are interned as the text read from each chunk; the raw
+    indices are mapped to accounts afterwards by _typed_accounts, once
+    the type pandas gives each whole id column is known.
+
+    Returns:
+        account_ids: account id of each account, in arrival order
+        raw_account: account of each raw interned index
+        raw: dict of read-only memmaps (senders, receivers, amounts,
+            timestamps) over every transaction
+        paths: the raw column files
+    """
+    dtypes = {'senders': np.int32, 'receivers': np.int32, 'amounts': np.int64, 'timestamps': np.int64}
+    paths = {name: os.path.join(store_dir, f'raw_{name}.bin') for name in dtypes}
+    handles = {name: open(path, 'wb') for name, path in paths.items()}
+
+    ids = {}
+    num_edges = 0
+    try:
+        for chunk in iter_transaction_chunks(csv_path, rows, time_range):
+            senders = [ids.setdefault(account, len(ids)) for account in chunk['sender_id'].tolist()]
+            receivers = [ids.setdefault(account, len(ids)) for account in chunk['receiver_id'].tolist()]
+            np.asarray(senders, dtype=np.int32).tofile(handles['senders'])
+            np.asarray(receivers, dtype=np.int32).tofile(handles['receivers'])
+            chunk['amount'].tofile(handles['amounts'])
+            chunk['timestamp'].tofile(handles['timestamps'])
+            num_edges += len(senders)
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    raw = {
+        name: np.memmap(paths[name], dtype=dtype, mode='r', shape=(num_edges,))
+        if num_edges else np.zeros(0, dtype=dtype)
+        for name, dtype in dtypes.items()
+    }
+    account_ids, raw_account = _typed_accounts(list(ids), raw, rows)
+    return account_ids, raw_account, raw, list(paths.values())
+
+def _id_kind(token):
+    """Index into ID_KINDS of the narrowest type pandas reads token as."""
+    if not isinstance(token, str):
+        return ID_KINDS.index(int) if isinstance(token, int) else ID_KINDS.index(float)
+    if INTEGER_ID.fullmatch(token):
+        return ID_KINDS.index(int)
+    if FLOAT_ID.fullmatch(token):
+        return ID_KINDS.index(float)
+    return ID_KINDS.index(str)
+
+def _typed_accounts(tokens, raw, rows):
+    """
+    Convert interned id tokens to the ids pd.read_csv gives the file.
+
+    pandas types sender_id and receiver_id per whole column: int64 when
+    every token is an integer, float64 when every token is a number and
+    one is not an integer, text otherwise. Chunks are read as text so
+    that choice cannot change between chunks; it is made here instead,
+    and tokens with equal values ('007' and '7', '7' and '7.0') become
+    one account, as they are one dictionary key in intern_accounts. An
+    account sent from keeps the sender column's type, as
+    intern_accounts sees the senders first.
+
+    Returns:
+        account_ids: distinct ids in first-seen order
+        raw_account: index into account_ids of each token
+    """
+    kinds = np.fromiter(map(_id_kind, tokens), dtype=np.int8, count=len(tokens))
+    sends = np.zeros(len(tokens), dtype=bool)
+    column_kind = {}
+    for name in ('senders', 'receivers'):
+        column_kind[name] = 0
+        for start, stop in _chunks(len(raw[name]), rows):
+            indices = np.asarray(raw[name][start:stop])
+            if len(indices):
+                column_kind[name] = max(column_kind[name], int(kinds[indices].max()))
+            if name == 'senders':
+                sends[indices] = True
+
+    if ID_KINDS[max(column_kind.values())] is str:
+        return tokens, np.arange(len(tokens), dtype=np.int64)
+
+    accounts = {}
+    raw_account = np.empty(len(tokens), dtype=np.int64)
+    for name, in_column in (('senders', sends), ('receivers', ~sends)):
+        convert = ID_KINDS[column_kind[name]]
+        for i in np.flatnonzero(in_column).tolist():
+            raw_account[i] = accounts.setdefault(convert(tokens[i]), len(accounts))
+    return list(accounts), raw_account
+
+def _chunks(num_edges, rows):
+    """(start, stop) ranges of at most rows edges."""
+    for start in range(0, num_edges, rows):
+        yield start, min(start + rows, num_edges)
+
+def _accumulate_features(raw, rank, num_accounts, rows):
+    """
+    Per-account features that reduce over transactions in any order.
+
+    Money totals are summed per account in _counting_sort instead, where
+    each account's edges are already grouped.
+
+    Returns:
+        dict with txn_count, first_seen, last_seen
+    """
+    txn_count = np.zeros(num_accounts, dtype=np.int64)
+    first_seen = np.full(num_accounts, np.iinfo(np.int64).max, dtype=np.int64)
+    last_seen = np.full(num_accounts, np.iinfo(np.int64).min, dtype=np.int64)
+
+    for start, stop in _chunks(len(raw['senders']), rows):
+        senders = rank[raw['senders'][start:stop]]
+        receivers = rank[raw['receivers'][start:stop]]
+        timestamps = np.asarray(raw['timestamps'][start:stop])
+
+        # A transfer to itself is one transaction, not two
+        txn_count += np.bincount(senders, minlength=num_accounts)
+        txn_count += np.bincount(receivers[senders != receivers], minlength=num_accounts)
+        for accounts in (senders, receivers):
+            np.minimum.at(first_seen, accounts, timestamps)
+            np.maximum.at(last_seen, accounts, timestamps)
+
+    return {
+        'txn_count': txn_count,
+        'first_seen': first_seen,
+        'last_seen': last_seen
+    }
+
+def _counting_sort(raw, key_name, peer_name, rank, num_accounts, prefix, rows):
+    """
+    Group every raw edge by rank[key] into mmap CSR files.
+
+    Pass one counts edges per account for the offsets; pass two scatters
+    each chunk to its slots. Within an account, edges land in arrival
+    (txn_index) order and are then sorted by (timestamp, txn_index) one
+    block of accounts at a time.
+
+    Returns:
+        (offsets, peers, amounts, timestamps, txn_index): CSR arrays,
+            peers as account ranks
+        distinct: distinct peers per account
+        totals: cents per account
+    """
+    num_edges = len(raw[key_name])
+    counts = np.zeros(num_accounts, dtype=np.int64)
+    for start, stop in _chunks(num_edges, rows):
+        counts += np.bincount(rank[raw[key_name][start:stop]], minlength=num_accounts)
+    offsets = np.zeros(num_accounts + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    peers, amounts, timestamps, txn_index = _open_columns(prefix, num_edges)
+    cursor = offsets[:-1].copy()
+    for start, stop in _chunks(num_edges, rows):
+        keys = rank[raw[key_name][start:stop]]
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        groups, group_starts, group_counts = np.unique(keys, return_index=True, return_counts=True)
+        slots = cursor[keys] + np.arange(len(keys)) - np.repeat(group_starts, group_counts)
+        cursor[groups] += group_counts
+
+        peers[slots] = rank[raw[peer_name][start:stop]][order]
+        amounts[slots] = raw['amounts'][start:stop][order]
+        timestamps[slots] = raw['timestamps'][start:stop][order]
+        txn_index[slots] = np.arange(start, stop, dtype=np.int64)[order]
+
+    distinct = np.zeros(num_accounts, dtype=np.int64)
+    totals = np.zeros(num_accounts, dtype=np.int64)
+    for first, last in _account_blocks(offsets, rows):
+        lo, hi = offsets[first], offsets[last]
+        owners = np.repeat(np.arange(last - first, dtype=np.int64), np.diff(offsets[first:last + 1]))
+        # Runs are still in arrival order here
+        totals[first:last] = np.bincount(owners, weights=amounts[lo:hi], minlength=last - first)
+        order = np.lexsort((txn_index[lo:hi], timestamps[lo:hi], owners))
+        for column in (peers, amounts, timestamps, txn_index):
+            column[lo:hi] = column[lo:hi][order]
+        pairs = np.unique(owners * num_accounts + peers[lo:hi])
+        distinct[first:last] = np.bincount(pairs // num_accounts, minlength=last - first)
+
+    for column in (peers, amounts, timestamps, txn_index):
+        column.flush()
+    return (offsets, peers, amounts, timestamps, txn_index), distinct, totals
+
+def _account_blocks(offsets, rows):
+    """(first, last) account ranges holding about rows edges each."""
+    num_accounts = len(offsets) - 1
+    first = 0
+    while first < num_accounts:
+        last = int(np.searchsorted(offsets, offsets[first] + rows, side='right')) - 1
+        last = min(max(last, first + 1), num_accounts)
+        yield first, last
+        first = last
+
+def _filter_csr(csr, keep, new_index, prefix, rows):
+    """
+    Copy the CSR runs of kept accounts, dropping edges to pruned peers.
+
+    Order within each run is preserved, so the result stays sorted.
+
+    Returns:
+        (offsets, peers, amounts, timestamps, txn_index) over the kept
+            accounts, edge columns as read-only memmaps
+        totals: sum of kept edge amounts per kept account
+    """
+    offsets, peers, amounts, timestamps, txn_index = csr
+
+    # Pass one: kept edges per kept account
+    kept_counts = np.zeros(len(keep), dtype=np.int64)
+    for first, last in _account_blocks(offsets, rows):
+        lo, hi = offsets[first], offsets[last]
+        owners = np.repeat(np.arange(first, last, dtype=np.int64), np.diff(offsets[first:last + 1]))
+        mask = keep[owners] & keep[peers[lo:hi]]
+        kept_counts[first:last] = np.bincount(owners[mask] - first, minlength=last - first)
+    kept_counts = kept_counts[keep]
+    new_offsets = np.zeros(len(kept_counts) + 1, dtype=np.int64)
+    np.cumsum(kept_counts, out=new_offsets[1:])
+
+    # Pass two: copy the kept edges in order
+    out_peers, out_amounts, out_timestamps, out_txn_index = _open_columns(prefix, int(new_offsets[-1]))
+    totals = np.zeros(len(keep), dtype=np.int64)
+    position = 0
+    for first, last in _account_blocks(offsets, rows):
+        lo, hi = offsets[first], offsets[last]
+        owners = np.repeat(np.arange(first, last, dtype=np.int64), np.diff(offsets[first:last + 1]))
+        mask = keep[owners] & keep[peers[lo:hi]]
+        count = int(mask.sum())
+        block_amounts = amounts[lo:hi][mask]
+        block_txn_index = txn_index[lo:hi][mask]
+        out_peers[position:position + count] = new_index[peers[lo:hi][mask]]
+        out_amounts[position:position + count] = block_amounts
+        out_timestamps[position:position + count] = timestamps[lo:hi][mask]
+        out_txn_index[position:position + count] = block_txn_index
+
+        # Sum in transaction order, like EdgeStore over unsorted edges
+        block_owners = owners[mask] - first
+        order = np.lexsort((block_txn_index, block_owners))
+        totals[first:last] = np.bincount(block_owners[order], weights=block_amounts[order], minlength=last - first)
+        position += count
+
+    columns = []
+    for column in (out_peers, out_amounts, out_timestamps, out_txn_index):
+        column.flush()
+        columns.append(_reopen(column))
+    return (new_offsets, *columns), totals[keep]
+
+def _open_columns(prefix, num_edges):
+    """Writable .npy memmaps for the CSR edge columns."""
+    return [
+        np.lib.format.open_memmap(f'{prefix}_{name}.npy', mode='w+', dtype=dtype, shape=(num_edges,))
+        for name, dtype in EDGE_COLUMNS
+    ]
+
+def _reopen(column):
+    """Reopen a finished column file read-only."""
+    return np.load(column.filename, mmap_mode='r')
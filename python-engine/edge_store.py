@@ -0,0 +1,243 @@
+from collections import namedtuple
+import numpy as np
+
+# Read-only slices of one account's incoming or outgoing transactions.
+# peers are account indices, amounts are cents, timestamps are epoch seconds,
+# txn_index is the row of the transaction in the source DataFrame. All are
+# numpy views, so taking a view never copies or allocates per edge.
+EdgeView = namedtuple('EdgeView', ['peers', 'amounts', 'timestamps', 'txn_index'])
+
+class EdgeStore:
+    """
+    Compact multi-edge transaction store in CSR layout.
+
+    Unlike the DiGraph, every transaction is kept, including repeated
+    transfers between the same sender and receiver. Edges are stored twice,
+    once grouped by sender and once by receiver, each group sorted by
+    (timestamp, txn_index):
+
+        out_offsets[i]:out_offsets[i + 1] -> outgoing edges of account i
+        in_offsets[i]:in_offsets[i + 1]   -> incoming edges of account i
+
+    Accounts are integers throughout: account i of the store is row
+    ids[i] of the shared, sorted id_table (also the row of the account in
+    the feature table). ids ascend, so iterating indices 0..n-1 is sorted
+    account_id order. The id table is only read to name accounts in the
+    output (account_id, accounts).
+    """
+
+    def __init__(self, accounts, senders, receivers, amounts, timestamps, txn_index, ids=None):
+        """
+        Args:
+            accounts: sorted id table (list of account ids)
+            senders, receivers: account index of each transaction
+            amounts: transaction amounts as int64 cents
+            timestamps: transaction times as int64 epoch seconds
+            txn_index: row index of each transaction in the source data
+            ids: ascending id table row of each store account; defaults
+                to every row of accounts
+        """
+        self.id_table = accounts
+        self.ids = np.arange(len(accounts), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+
+        num_accounts = len(self.ids)
+        senders = np.asarray(senders, dtype=np.int32)
+        receivers = np.asarray(receivers, dtype=np.int32)
+        amounts = np.asarray(amounts, dtype=np.int64)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        txn_index = np.asarray(txn_index, dtype=np.int64)
+
+        out_order = np.lexsort((txn_index, timestamps, senders))
+        self.out_offsets = _offsets(senders, num_accounts)
+        self.out_peers = receivers[out_order]
+        self.out_amounts = amounts[out_order]
+        self.out_timestamps = timestamps[out_order]
+        self.out_txn_index = txn_index[out_order]
+
+        in_order = np.lexsort((txn_index, timestamps, receivers))
+        self.in_offsets = _offsets(receivers, num_accounts)
+        self.in_peers = senders[in_order]
+        self.in_amounts = amounts[in_order]
+        self.in_timestamps = timestamps[in_order]
+        self.in_txn_index = txn_index[in_order]
+
+        # Per-account cent totals over every transaction; the float64
+        # bincount is exact for any total below 2**53 cents
+        self.total_in = np.bincount(receivers, weights=amounts, minlength=num_accounts).astype(np.int64)
+        self.total_out = np.bincount(senders, weights=amounts, minlength=num_accounts).astype(np.int64)
+
+    @classmethod
+    def from_csr(cls, accounts, ids, out_arrays, in_arrays, total_in, total_out):
+        """
+        Wrap CSR arrays that are already built and sorted, without copying.
+
+        accounts and ids are as in __init__. out_arrays and in_arrays are
+        (offsets, peers, amounts, timestamps, txn_index) in the layout
+        described above. They may be read-only memory maps (see
+        disk_store.build_disk_store).
+        """
+        store = cls.__new__(cls)
+        store.id_table = accounts
+        store.ids = np.asarray(ids, dtype=np.int64)
+        (
+            store.out_offsets, store.out_peers, store.out_amounts,
+            store.out_timestamps, store.out_txn_index
+        ) = out_arrays
+        (
+            store.in_offsets, store.in_peers, store.in_amounts,
+            store.in_timestamps, store.in_txn_index
+        ) = in_arrays
+        store.total_in = total_in
+        store.total_out = total_out
+        return store
+
+    @property
+    def num_accounts(self):
+        return len(self.ids)
+
+    @property
+    def accounts(self):
+        """Account ids of the store's accounts, in index order."""
+        return [self.id_table[row] for row in self.ids.tolist()]
+
+    def account_id(self, i):
+        """Account id of account index i."""
+        return self.id_table[self.ids[i]]
+
+    @property
+    def num_edges(self):
+        return len(self.out_peers)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the edge and offset arrays (excluding the id table)."""
+        arrays = (
+            self.out_offsets, self.out_peers, self.out_amounts,
+            self.out_timestamps, self.out_txn_index,
+            self.in_offsets, self.in_peers, self.in_amounts,
+            self.in_timestamps, self.in_txn_index,
+            self.total_in, self.total_out
+        )
+        return sum(array.nbytes for array in arrays)
+
+    def out_degrees(self):
+        """Distinct successors per account (the DiGraph out-degree)."""
+        return _distinct_counts(self.out_offsets, self.out_peers, self.num_accounts)
+
+    def in_degrees(self):
+        """Distinct predecessors per account (the DiGraph in-degree)."""
+        return _distinct_counts(self.in_offsets, self.in_peers, self.num_accounts)
+
+    def edge_senders(self):
+        """Sender index of every edge in the outgoing (by-sender) layout."""
+        return np.repeat(np.arange(self.num_accounts, dtype=np.int64), np.diff(self.out_offsets))
+
+    def edge_blocks(self, max_edges=1 << 22):
+        """
+        Yield (senders, receivers) index arrays for runs of whole accounts
+        holding about max_edges outgoing edges each, so memory-mapped
+        stores are scanned without materializing every edge at once.
+        """
+        offsets = self.out_offsets
+        start = 0
+        while start < self.num_accounts:
+            # Last account whose edges still fit, but always at least one
+            stop = int(np.searchsorted(offsets, offsets[start] + max_edges, side='right')) - 1
+            stop = min(max(stop, start + 1), self.num_accounts)
+            lo, hi = offsets[start], offsets[stop]
+            senders = np.repeat(np.arange(start, stop, dtype=np.int64), np.diff(offsets[start:stop + 1]))
+            yield senders, np.asarray(self.out_peers[lo:hi], dtype=np.int64)
+            start = stop
+
+    def weak_components(self):
+        """
+        Label every account with its weakly connected component.
+        
+        Vectorized hook-and-jump label propagation: each round hooks the
+        label of every edge endpoint onto the smaller of the two, then
+        follows label pointers to their roots. Needs O(log n) rounds.
+        Edges are scanned in edge_blocks, so only the labels and one
+        block are in memory.
+        
+        Returns:
+            int array of labels; each label is the smallest account index
+            in the component
+        """
+        labels = np.arange(self.num_accounts, dtype=np.int64)
+        while True:
+            hooked = labels.copy()
+            for senders, receivers in self.edge_blocks():
+                smaller = np.minimum(labels[senders], labels[receivers])
+                np.minimum.at(hooked, labels[senders], smaller)
+                np.minimum.at(hooked, labels[receivers], smaller)
+            while True:
+                jumped = hooked[hooked]
+                if np.array_equal(jumped, hooked):
+                    break
+                hooked = jumped
+            if np.array_equal(hooked, labels):
+                return labels
+            labels = hooked
+
+    def subset(self, account_indices):
+        """
+        EdgeStore restricted to the given accounts (sorted indices).
+        
+        Gathers the outgoing edge runs of the given accounts straight from
+        the CSR offsets, so only the subset's edges are read. account_indices
+        should be closed under adjacency (whole components); edges to
+        accounts outside the subset are dropped. Account order is preserved.
+        """
+        account_indices = np.asarray(account_indices, dtype=np.int64)
+        local = np.full(self.num_accounts, -1, dtype=np.int64)
+        local[account_indices] = np.arange(len(account_indices))
+        
+        starts = self.out_offsets[account_indices]
+        counts = self.out_offsets[account_indices + 1] - starts
+        run_starts = np.cumsum(counts) - counts
+        positions = np.repeat(starts - run_starts, counts) + np.arange(int(counts.sum()))
+        
+        senders = np.repeat(np.arange(len(account_indices)), counts)
+        receivers = local[self.out_peers[positions]]
+        keep = receivers >= 0
+        return EdgeStore(
+            self.id_table,
+            senders[keep],
+            receivers[keep],
+            self.out_amounts[positions][keep],
+            self.out_timestamps[positions][keep],
+            self.out_txn_index[positions][keep],
+            ids=self.ids[account_indices]
+        )
+
+    def successors(self, i):
+        """Outgoing transactions of account index i, sorted by time."""
+        lo, hi = self.out_offsets[i], self.out_offsets[i + 1]
+        return EdgeView(
+            self.out_peers[lo:hi],
+            self.out_amounts[lo:hi],
+            self.out_timestamps[lo:hi],
+            self.out_txn_index[lo:hi]
+        )
+
+    def predecessors(self, i):
+        """Incoming transactions of account index i, sorted by time."""
+        lo, hi = self.in_offsets[i], self.in_offsets[i + 1]
+        return EdgeView(
+            self.in_peers[lo:hi],
+            self.in_amounts[lo:hi],
+            self.in_timestamps[lo:hi],
+            self.in_txn_index[lo:hi]
+        )
+
+def _offsets(keys, num_accounts):
+    """CSR offsets (length num_accounts + 1) for edges grouped by keys."""
+    offsets = np.zeros(num_accounts + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=num_accounts), out=offsets[1:])
+    return offsets
+
+def _distinct_counts(offsets, peers, num_accounts):
+    """Number of distinct peers per account for one side of the CSR layout."""
+    owners = np.repeat(np.arange(num_accounts, dtype=np.int64), np.diff(offsets))
+    pairs = np.unique(owners * max(num_accounts, 1) + peers)
+    return np.bincount(pairs // max(num_accounts, 1), minlength=num_accounts)
@@ -1,45 +1,500 @@
-import pandas as pd
-import networkx as nx
-from datetime import datetime
+import os
+import re
+import csv
+import warnings
+import numpy as np
+from edge_store import EdgeStore
+from account_graph import AccountGraph
+from account_features import AccountFeatures
 
-def build_graph(csv_path):
+# Uploads up to this size are parsed with the stdlib csv module, so pandas
+# is never imported for them. Past roughly this size pd.read_csv wins back
+# its import cost (about 0.25s).
+LIGHT_LOADER_MAX_BYTES = 8 * 1024 * 1024
+
+TRANSACTION_COLUMNS = ['transaction_id', 'sender_id', 'receiver_id', 'amount', 'timestamp']
+
+# The only timestamp layout the light loader parses: ISO dates with a
+# 'T' or space separator and whole seconds. Matched against the whole
+# column joined by newlines, so the scan stays inside the regex engine.
+LIGHT_TIMESTAMPS = re.compile(r'(?:\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}\n)*')
+
+# Strings pd.read_csv reads as missing values by default
+PANDAS_NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None',
+    'n/a', 'nan', 'null'
+])
+
+# File suffixes read through pyarrow instead of as CSV
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+ARROW_SUFFIXES = ('.arrow', '.feather', '.ipc')
+
+class UnsupportedLightCSV(ValueError):
+    """The CSV needs pandas' type inference or timestamp parsing."""
+
+def load_transactions(csv_path, loader='auto', time_range=None):
     """
-    Build a directed graph from transaction CSV.
+    Read the transaction file into column arrays.
+    
+    Parquet (.parquet, .pq) and Arrow IPC (.arrow, .feather, .ipc) files
+    are read with pyarrow (read_transactions_arrow). For CSV, loader
+    picks the parser:
+    - 'light': stdlib csv plus NumPy, no pandas import
+    - 'pandas': pd.read_csv and pd.to_datetime
+    - 'auto': light for files up to LIGHT_LOADER_MAX_BYTES, pandas for
+      larger ones or whenever the light loader cannot reproduce pandas
+    
+    time_range is an optional (start, end) pair of epoch seconds, either
+    None; only transactions with start <= timestamp < end are kept.
     
     Returns:
-        G: NetworkX DiGraph with transaction edges
-        df: Original DataFrame
+        dict of column arrays:
+            transaction_id, sender_id, receiver_id: ids as parsed
+            amount: int64 cents (see to_cents)
+            timestamp: int64 epoch seconds
     """
+    file_format = input_format(csv_path)
+    if file_format != 'csv':
+        transactions = read_transactions_arrow(csv_path, file_format, time_range)
+    elif loader == 'auto':
+        transactions = None
+        if os.path.getsize(csv_path) <= LIGHT_LOADER_MAX_BYTES:
+            try:
+                transactions = read_transactions_light(csv_path)
+            except UnsupportedLightCSV:
+                pass
+        if transactions is None:
+            transactions = read_transactions_pandas(csv_path)
+    elif loader == 'light':
+        transactions = read_transactions_light(csv_path)
+    elif loader == 'pandas':
+        transactions = read_transactions_pandas(csv_path)
+    else:
+        raise ValueError(f"Unknown loader: {loader}")
+    
+    return filter_time_range(transactions, time_range)
+
+def input_format(path):
+    """'parquet', 'arrow' or 'csv', from the file suffix."""
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in PARQUET_SUFFIXES:
+        return 'parquet'
+    if suffix in ARROW_SUFFIXES:
+        return 'arrow'
+    return 'csv'
+
+def parse_time_bound(value):
+    """Parse a --from/--to timestamp (ISO date or date-time) to epoch seconds."""
+    try:
+        return int(np.datetime64(value, 's').astype(np.int64))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value}")
+
+def filter_time_range(transactions, time_range):
+    """Keep the transactions with start <= timestamp < end."""
+    if time_range is None:
+        return transactions
+    start, end = time_range
+    keep = np.ones(len(transactions['timestamp']), dtype=bool)
+    if start is not None:
+        keep &= transactions['timestamp'] >= start
+    if end is not None:
+        keep &= transactions['timestamp'] < end
+    if keep.all():
+        return transactions
+    return {name: column[keep] for name, column in transactions.items()}
+
+def read_transactions_pandas(csv_path):
+    """Read the transaction CSV with pandas (see load_transactions)."""
+    import pandas as pd
+    
     df = pd.read_csv(csv_path)
     
     # Convert timestamp to datetime
     df['timestamp'] = pd.to_datetime(df['timestamp'])
     
-    G = nx.DiGraph()
+    return {
+        'transaction_id': df['transaction_id'].to_numpy(),
+        'sender_id': df['sender_id'].to_numpy(),
+        'receiver_id': df['receiver_id'].to_numpy(),
+        'amount': to_cents(df['amount'].to_numpy(dtype=np.float64)),
+        'timestamp': to_epoch_seconds(df['timestamp'])
+    }
+
+def arrow_dataset(path, file_format):
+    """Open a Parquet or Arrow IPC file as a pyarrow dataset."""
+    try:
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise ImportError(f"Reading {file_format} input requires pyarrow (pip install pyarrow)")
+    return ds.dataset(path, format='parquet' if file_format == 'parquet' else 'ipc')
+
+def arrow_time_filter(dataset, time_range):
+    """
+    Dataset filter expression for time_range.
+    
+    Only built when the timestamp column has an Arrow timestamp type, so
+    Parquet row groups whose min/max statistics fall outside the range
+    are skipped without decoding. Text timestamps cannot be compared
+    before parsing and are filtered afterwards by filter_time_range.
+    
+    Returns:
+        pyarrow expression, or None when there is nothing to push down
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    
+    if time_range is None:
+        return None
+    column_type = dataset.schema.field('timestamp').type
+    if not pa.types.is_timestamp(column_type):
+        return None
+    
+    bound_type = pa.timestamp('s', tz=column_type.tz)
+    start, end = time_range
+    expression = None
+    if start is not None:
+        expression = ds.field('timestamp') >= pa.scalar(start, type=bound_type)
+    if end is not None:
+        before_end = ds.field('timestamp') < pa.scalar(end, type=bound_type)
+        expression = before_end if expression is None else expression & before_end
+    return expression
+
+def arrow_columns(table):
+    """
+    Convert a pyarrow Table or RecordBatch of TRANSACTION_COLUMNS into
+    the column arrays of load_transactions.
+    """
+    import pyarrow as pa
+    
+    for name in TRANSACTION_COLUMNS:
+        if table.column(name).null_count:
+            raise ValueError(f"Missing values in column {name}")
+    
+    timestamps = table.column('timestamp')
+    if pa.types.is_timestamp(timestamps.type):
+        # Epoch values in the column's own unit, floored to seconds
+        per_second = {'s': 1, 'ms': 10 ** 3, 'us': 10 ** 6, 'ns': 10 ** 9}[timestamps.type.unit]
+        epoch_seconds = np.asarray(timestamps.cast(pa.int64())) // per_second
+    else:
+        epoch_seconds = parse_timestamps(timestamps.cast(pa.string()).to_pylist())
+    
+    return {
+        'transaction_id': np.asarray(table.column('transaction_id').to_pylist(), dtype=object),
+        'sender_id': _id_array(table.column('sender_id').to_pylist()),
+        'receiver_id': _id_array(table.column('receiver_id').to_pylist()),
+        'amount': to_cents(np.asarray(table.column('amount').cast(pa.float64()), dtype=np.float64)),
+        'timestamp': np.asarray(epoch_seconds, dtype=np.int64)
+    }
+
+def _id_array(values):
+    """Account ids as an int64 array when numeric, else an object array."""
+    if values and all(isinstance(value, int) for value in values):
+        return np.asarray(values, dtype=np.int64)
+    return np.asarray(values, dtype=object)
+
+def read_transactions_arrow(path, file_format, time_range=None):
+    """
+    Read a Parquet or Arrow IPC file with pyarrow (see load_transactions).
+    
+    Only the five transaction columns are read, and a time_range on an
+    Arrow timestamp column is pushed down into the scan.
+    """
+    dataset = arrow_dataset(path, file_format)
+    table = dataset.to_table(columns=TRANSACTION_COLUMNS, filter=arrow_time_filter(dataset, time_range))
+    return arrow_columns(table)
+
+def read_transaction_records(records):
+    """
+    Convert transaction records (dicts with TRANSACTION_COLUMNS, as
+    parsed from NDJSON or CSV rows) into the column arrays of
+    load_transactions.
+    
+    Account ids are kept as text. Raises ValueError for a record without
+    one of the columns or with a value that does not parse.
+    """
+    if not all(isinstance(record, dict) for record in records):
+        raise TypeError("Every transaction must be an object")
     
-    # Add edges with attributes
-    for _, row in df.iterrows():
-        G.add_edge(
-            row['sender_id'],
-            row['receiver_id'],
-            amount=float(row['amount']),
-            timestamp=row['timestamp'],
-            transaction_id=row['transaction_id']
-        )
+    columns = {name: [record.get(name) for record in records] for name in TRANSACTION_COLUMNS}
+    for column in columns.values():
+        # None is JSON null; a value unequal to itself is NaN
+        if any(value is None or value != value for value in column):
+            raise ValueError(f"Every transaction needs {', '.join(TRANSACTION_COLUMNS)}")
     
-    return G, df
+    return {
+        'transaction_id': np.array(columns['transaction_id'], dtype=object),
+        'sender_id': np.array([str(value) for value in columns['sender_id']], dtype=object),
+        'receiver_id': np.array([str(value) for value in columns['receiver_id']], dtype=object),
+        'amount': to_cents([float(value) for value in columns['amount']]),
+        'timestamp': parse_timestamps(columns['timestamp'])
+    }
+
+def iter_transaction_chunks(path, rows, time_range=None):
+    """
+    Yield the transaction file as column-array chunks of at most rows rows.
+    
+    CSV is read with pandas in chunks, with account ids kept as text so
+    their type cannot change between chunks. Parquet and Arrow IPC are
+    scanned batch by batch with the same column and time pushdown as
+    read_transactions_arrow.
+    """
+    file_format = input_format(path)
+    if file_format == 'csv':
+        import pandas as pd
+        
+        reader = pd.read_csv(path, chunksize=rows, dtype={'sender_id': str, 'receiver_id': str})
+        for chunk in reader:
+            yield filter_time_range({
+                'transaction_id': chunk['transaction_id'].to_numpy(),
+                'sender_id': chunk['sender_id'].to_numpy(),
+                'receiver_id': chunk['receiver_id'].to_numpy(),
+                'amount': to_cents(chunk['amount'].to_numpy(dtype=np.float64)),
+                'timestamp': to_epoch_seconds(pd.to_datetime(chunk['timestamp']))
+            }, time_range)
+        return
+    
+    dataset = arrow_dataset(path, file_format)
+    batches = dataset.to_batches(
+        columns=TRANSACTION_COLUMNS,
+        filter=arrow_time_filter(dataset, time_range),
+        batch_size=rows
+    )
+    for batch in batches:
+        yield filter_time_range(arrow_columns(batch), time_range)
+
+def read_transactions_light(csv_path):
+    """
+    Read the transaction CSV with the csv module (see load_transactions).
+    
+    Gives the same columns as read_transactions_pandas. Raises
+    UnsupportedLightCSV for anything pandas would read differently:
+    missing values, all-numeric account ids (pandas makes them numbers)
+    and timestamps other than YYYY-MM-DD[T ]HH:MM:SS. Transaction ids are
+    only carried along, so they stay strings either way.
+    """
+    with open(csv_path, newline='', encoding='utf-8-sig') as handle:
+        reader = csv.reader(handle)
+        header = next(reader, None)
+        rows = [row for row in reader if row]
+    
+    if header is None:
+        raise UnsupportedLightCSV("empty CSV")
+    if set(map(len, rows)) - {len(header)}:
+        raise UnsupportedLightCSV("ragged rows")
+    
+    position = {name: i for i, name in enumerate(header)}
+    missing = [name for name in TRANSACTION_COLUMNS if name not in position]
+    if missing:
+        raise KeyError(missing[0])
+    values = list(zip(*rows)) if rows else [()] * len(header)
+    columns = {name: values[position[name]] for name in TRANSACTION_COLUMNS}
+    
+    for name, column in columns.items():
+        if not PANDAS_NA_VALUES.isdisjoint(column):
+            raise UnsupportedLightCSV(f"missing values in {name}")
+    for name in ('sender_id', 'receiver_id'):
+        if _all_numeric(columns[name]):
+            raise UnsupportedLightCSV(f"numeric {name}")
+    
+    try:
+        amounts = to_cents([float(value) for value in columns['amount']])
+    except ValueError as e:
+        raise UnsupportedLightCSV(f"amount: {e}")
+    
+    timestamps = parse_timestamps_light(columns['timestamp'])
+    
+    return {
+        'transaction_id': np.array(columns['transaction_id'], dtype=object),
+        'sender_id': np.array(columns['sender_id'], dtype=object),
+        'receiver_id': np.array(columns['receiver_id'], dtype=object),
+        'amount': amounts,
+        'timestamp': timestamps
+    }
+
+def parse_timestamps(values):
+    """
+    Parse timestamp values to int64 epoch seconds.
+    
+    YYYY-MM-DD[T ]HH:MM:SS strings are parsed with NumPy
+    (parse_timestamps_light); anything else goes through pd.to_datetime.
+    """
+    if all(isinstance(value, str) for value in values):
+        try:
+            return parse_timestamps_light(values)
+        except UnsupportedLightCSV:
+            pass
+    import pandas as pd
+    return to_epoch_seconds(pd.to_datetime(pd.Series(values)))
+
+def parse_timestamps_light(values):
+    """
+    Parse YYYY-MM-DD[T ]HH:MM:SS strings to int64 epoch seconds with NumPy.
+    
+    Raises UnsupportedLightCSV for any other layout.
+    """
+    if not LIGHT_TIMESTAMPS.fullmatch('\n'.join(values) + '\n'):
+        raise UnsupportedLightCSV("timestamp format")
+    
+    # Out-of-range dates must fall back, not wrap around
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        try:
+            return np.array(values, dtype='datetime64[s]').astype(np.int64)
+        except (ValueError, Warning) as e:
+            raise UnsupportedLightCSV(f"timestamp: {e}")
+
+def _all_numeric(values):
+    """True if every value parses as a number, as pandas would infer."""
+    try:
+        for value in values:
+            float(value)
+    except ValueError:
+        return False
+    return True
+
+def intern_accounts(sender_ids, receiver_ids):
+    """
+    Intern account ids into dense integer ranks, once per load.
+    
+    The distinct ids are collected with dict.fromkeys and only those are
+    sorted, so rank order is sorted account_id order and every later
+    ordering compares integers instead of re-sorting strings.
+    
+    Returns:
+        id_table: sorted list of the distinct account ids (rank -> id)
+        senders, receivers: int32 rank of each transaction's accounts
+    """
+    sender_list = sender_ids.tolist()
+    receiver_list = receiver_ids.tolist()
+    distinct = dict.fromkeys(sender_list)
+    distinct.update(dict.fromkeys(receiver_list))
+    id_table = sorted(distinct)
+    
+    rank = {account: i for i, account in enumerate(id_table)}
+    senders = np.fromiter(map(rank.__getitem__, sender_list), dtype=np.int32, count=len(sender_list))
+    receivers = np.fromiter(map(rank.__getitem__, receiver_list), dtype=np.int32, count=len(receiver_list))
+    return id_table, senders, receivers
+
+def build_graph(csv_path, loader='auto', time_range=None):
+    """
+    Build the directed account graph from a transaction file (see
+    load_transactions), interning account ids on the way.
+    
+    Returns:
+        G: AccountGraph over every account in the file
+        transactions: column arrays from load_transactions
+    """
+    transactions = load_transactions(csv_path, loader, time_range)
+    G = AccountGraph(*intern_accounts(transactions['sender_id'], transactions['receiver_id']))
+    return G, transactions
 
 def prune_isolated_nodes(G):
     """
     Remove nodes with in_degree == 0 OR out_degree == 0.
     
+    Degrees are taken once, before any node is removed, over the edges
+    between remaining nodes.
+    
     Returns:
         Pruned graph
     """
-    nodes_to_remove = [
-        node for node in G.nodes()
-        if G.in_degree(node) == 0 or G.out_degree(node) == 0
-    ]
-    
-    G.remove_nodes_from(nodes_to_remove)
+    keep = G.edge_mask()
+    num_accounts = len(G.id_table)
+    sends = np.bincount(G.senders[keep], minlength=num_accounts) > 0
+    receives = np.bincount(G.receivers[keep], minlength=num_accounts) > 0
+    G.active &= sends & receives
     return G
+
+def to_cents(amounts):
+    """
+    Convert amounts to an int64 array of cents, rounded to the nearest cent.
+    
+    Money is integer cents from ingestion on, so totals, ratios and the
+    amount comparisons in the detectors are exact.
+    """
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+def to_epoch_seconds(timestamps):
+    """Convert a datetime Series to an int64 array of epoch seconds."""
+    return timestamps.to_numpy().astype('datetime64[s]').astype(np.int64)
+
+def build_edge_store(G, transactions):
+    """
+    Build the multi-edge EdgeStore for the accounts left in G.
+    
+    Keeps every transaction whose sender and receiver both survived
+    pruning, including repeated transfers between the same pair that
+    the graph counts as one edge. Ranks are remapped to store indices
+    with one array lookup; the id table is shared, not copied.
+    
+    Returns:
+        EdgeStore indexed in sorted account_id order
+    """
+    ids = G.nodes()
+    index = np.full(len(G.id_table), -1, dtype=np.int64)
+    index[ids] = np.arange(len(ids))
+    keep = G.edge_mask()
+    
+    return EdgeStore(
+        G.id_table,
+        index[G.senders[keep]],
+        index[G.receivers[keep]],
+        transactions['amount'][keep],
+        transactions['timestamp'][keep],
+        np.flatnonzero(keep),
+        ids=ids
+    )
+
+def build_account_features(G, transactions):
+    """
+    Build the per-account feature table from the transaction columns.
+    
+    Every transaction contributes to its sender and its receiver; the
+    features are bincounts and reductions over the ranks interned in G,
+    so no DataFrame is needed. Covers every account in the CSV, before
+    pruning, so rows line up with G.id_table.
+    
+    Returns:
+        AccountFeatures (one row per rank) with columns:
+            txn_count: transactions the account takes part in
+            distinct_senders: unique accounts that sent to it
+            distinct_receivers: unique accounts it sent to
+            total_in, total_out: cents received / sent
+            first_seen, last_seen: first and last transaction timestamp
+    """
+    num_accounts = len(G.id_table)
+    senders = G.senders.astype(np.int64)
+    receivers = G.receivers.astype(np.int64)
+    amounts = transactions['amount']
+    timestamps = transactions['timestamp']
+    
+    # A transfer to itself is one transaction, not two
+    self_loops = senders == receivers
+    txn_count = (
+        np.bincount(senders, minlength=num_accounts) +
+        np.bincount(receivers[~self_loops], minlength=num_accounts)
+    )
+    
+    # Distinct counterparties from the unique (account, peer) pairs
+    sent_pairs = np.unique(senders * num_accounts + receivers)
+    received_pairs = np.unique(receivers * num_accounts + senders)
+    
+    both = np.concatenate([senders, receivers])
+    both_times = np.concatenate([timestamps, timestamps])
+    first_seen = np.full(num_accounts, np.iinfo(np.int64).max, dtype=np.int64)
+    last_seen = np.full(num_accounts, np.iinfo(np.int64).min, dtype=np.int64)
+    np.minimum.at(first_seen, both, both_times)
+    np.maximum.at(last_seen, both, both_times)
+    
+    return AccountFeatures(
+        G.id_table,
+        txn_count=txn_count,
+        distinct_senders=np.bincount(received_pairs // max(num_accounts, 1), minlength=num_accounts),
+        distinct_receivers=np.bincount(sent_pairs // max(num_accounts, 1), minlength=num_accounts),
+        total_in=np.bincount(receivers, weights=amounts, minlength=num_accounts).astype(np.int64),
+        total_out=np.bincount(senders, weights=amounts, minlength=num_accounts).astype(np.int64),
+        first_seen=first_seen,
+        last_seen=last_seen
+    )
@@ -0,0 +1,229 @@
+"""
+Opt-in per-stage instrumentation (main.py --diagnostics, --profile).
+
+Pipeline stages run inside Instrumentation.stage(name), which records
+wall time, CPU time, peak traced memory and item counts. Repeated stages
+(a detector running once per work unit) are aggregated under one name.
+Work done in forked pool workers is recorded in the child and merged back
+by parallel.run_tasks.
+
+With a profile directory, every stage is also profiled (profiling.py)
+and write_profiles() writes its pstats and collapsed stacks there.
+
+A disabled Instrumentation (the default everywhere) records nothing, so
+call sites never need to check whether diagnostics were asked for.
+"""
+import time
+import cProfile
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from profiling import StackSampler, write_stage_profile
+
+MB = 1024 * 1024
+
+class StageRecord:
+    """Measurements of one named stage, summed over its calls."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_memory_bytes = None
+        self.counts = {}
+        # Filled only when profiling: cProfile stats dicts, one per call,
+        # and a Counter of folded stacks
+        self.profile_stats = []
+        self.stack_samples = Counter()
+        # Filled only with hotspots: most expensive accounts, from
+        # detectors.hotspot_entries
+        self.hotspots = []
+
+    def count(self, **counts):
+        """Add item counts (nodes, edges, candidates, ...) to this stage."""
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + int(value)
+
+    def add_hotspots(self, entries):
+        """Add per-account work entries (see detectors.hotspot_entries)."""
+        self.hotspots.extend(entries)
+
+    def merge(self, other):
+        """Fold another record of the same stage into this one."""
+        self.calls += other.calls
+        self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        if other.peak_memory_bytes is not None:
+            self.peak_memory_bytes = max(self.peak_memory_bytes or 0, other.peak_memory_bytes)
+        self.count(**other.counts)
+        self.profile_stats.extend(other.profile_stats)
+        self.stack_samples.update(other.stack_samples)
+        self.hotspots.extend(other.hotspots)
+
+    def to_dict(self, top_n=0):
+        entry = {
+            "name": self.name,
+            "calls": self.calls,
+            "wall_seconds": round(self.wall_seconds, 4),
+            "cpu_seconds": round(self.cpu_seconds, 4)
+        }
+        if self.peak_memory_bytes is not None:
+            entry["peak_memory_mb"] = round(self.peak_memory_bytes / MB, 2)
+        entry["counts"] = self.counts
+        if self.hotspots and top_n:
+            # Work units hold disjoint accounts, so the overall top_n is
+            # among the per-unit top_n lists
+            ranked = sorted(
+                self.hotspots,
+                key=lambda hotspot: (-(hotspot["expansions"] + hotspot["pruned"]), -hotspot["seconds"])
+            )
+            entry["hotspots"] = ranked[:top_n]
+        return entry
+
+class _DisabledRecord:
+    """Stand-in record for a disabled Instrumentation."""
+
+    def count(self, **counts):
+        pass
+
+    def add_hotspots(self, entries):
+        pass
+
+_DISABLED_RECORD = _DisabledRecord()
+
+class Instrumentation:
+    """
+    Collects StageRecords for one analysis.
+
+    With memory=True, tracemalloc runs while stages are open, and each
+    stage reports its peak allocation above what was live when it began
+    (nested stages included). Tracing slows allocation-heavy stages
+    noticeably, so wall times are best read from a run without it.
+
+    With profile_dir, each stage runs under cProfile (unless another stage
+    already profiles it from further out) and the stack sampler.
+
+    With hotspots=N, the path-searching detectors count their work per
+    account (DFS expansions, pruned branches, time) and each of their
+    stages reports its N most expensive accounts with degree stats.
+    """
+
+    def __init__(self, enabled=True, memory=True, profile_dir=None, hotspots=0):
+        self.enabled = enabled
+        self.memory = enabled and memory
+        self.profile_dir = profile_dir if enabled else None
+        self.hotspots = hotspots if enabled else 0
+        self.stages = {}
+        self._open = []
+        self._started_tracing = False
+        self._profiling = False
+        self._sampler = StackSampler() if self.profile_dir and StackSampler.available() else None
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the body as one call of stage name; yields its record."""
+        if not self.enabled:
+            yield _DISABLED_RECORD
+            return
+
+        record = StageRecord(name)
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            # Hand the enclosing stage the peak it reached so far, then
+            # measure this stage's peak from a fresh baseline
+            current, peak = tracemalloc.get_traced_memory()
+            if self._open:
+                self._open[-1][1] = max(self._open[-1][1], peak)
+            tracemalloc.reset_peak()
+            self._open.append([current, current])
+
+        profile = None
+        if self._sampler is not None:
+            self._sampler.add(record.stack_samples)
+        if self.profile_dir:
+            # cProfile cannot nest; an enclosing stage's profile covers this one
+            if not self._profiling:
+                profile = cProfile.Profile()
+                self._profiling = True
+                profile.enable()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+                profile.create_stats()
+                record.profile_stats.append(profile.stats)
+                self._profiling = False
+            if self._sampler is not None:
+                self._sampler.remove(record.stack_samples)
+            record.calls = 1
+            record.wall_seconds = time.perf_counter() - wall_start
+            record.cpu_seconds = time.process_time() - cpu_start
+            if self.memory:
+                start, peak = self._open.pop()
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                record.peak_memory_bytes = peak - start
+                if self._open:
+                    self._open[-1][1] = max(self._open[-1][1], peak)
+            self.add(record)
+
+    def add(self, record):
+        """Record one finished stage call, aggregating by name."""
+        if record.name in self.stages:
+            self.stages[record.name].merge(record)
+        else:
+            self.stages[record.name] = record
+
+    def merge(self, records):
+        """Fold records from another process (see parallel.run_tasks)."""
+        for record in records:
+            self.add(record)
+
+    def reset(self):
+        """Forget all records; used by forked workers before each task."""
+        self.stages = {}
+        self._open = []
+        self._profiling = False
+        if self._sampler is not None:
+            self._sampler.stop()
+
+    def close(self):
+        """Stop tracemalloc if this instance started it."""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def write_profiles(self):
+        """
+        Write every stage's pstats and collapsed stacks to profile_dir.
+
+        Returns:
+            list of the paths written
+        """
+        paths = []
+        if self.profile_dir:
+            for record in self.stages.values():
+                paths.extend(write_stage_profile(
+                    self.profile_dir, record.name, record.profile_stats, record.stack_samples
+                ))
+        return paths
+
+    def report(self):
+        """
+        The diagnostics block.
+
+        Returns:
+            dict with memory_traced and the stage records in first-run order
+        """
+        return {
+            "memory_traced": self.memory,
+            "stages": [record.to_dict(self.hotspots) for record in self.stages.values()]
+        }
+
+DISABLED = Instrumentation(enabled=False)
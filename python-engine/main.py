@@ -1,9 +1,13 @@
 import sys
 import json
 import time
-from graph_builder import build_graph, prune_isolated_nodes
-from detectors import detect_all_patterns
+import argparse
+from graph_builder import build_graph, prune_isolated_nodes, build_edge_store, build_account_features, parse_time_bound
+from disk_store import DEFAULT_MEMORY_BUDGET_MB, build_disk_store, max_unit_edges
+from detectors import detect_all_patterns, detect_all_patterns_by_component
 from ring_grouper import group_rings_by_pattern
+from instrumentation import DISABLED, Instrumentation
+from result_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB, ResultCache, cache_key
 
 class DeterministicJSONEncoder(json.JSONEncoder):
     """Custom JSON encoder ensuring deterministic float formatting."""
@@ -45,69 +49,61 @@ def calculate_suspicion_score(patterns):
     
     return min(score, 100)
 
-def main():
-    """MuleRift - Graph-based money muling detection engine.
+def detected_patterns_for(account_id, results):
+    """Descriptive pattern names for one account, sorted alphabetically."""
+    detected_patterns = []
     
-    Analyzes transaction CSV to detect:
-    - Circular Fund Routing (Cycles)
-    - Smurfing Patterns (Fan-in / Fan-out)
-    - Layered Shell Networks
-    """
-    if len(sys.argv) < 2:
-        print(json.dumps({"error": "Usage: python main.py <csv_path>"}), file=sys.stderr)
-        sys.exit(1)
-
-    csv_path = sys.argv[1]
-    start_time = time.time()
+    # Add descriptive pattern names in DETERMINISTIC ORDER
+    if account_id in results['cycle_nodes']:
+        detected_patterns.append(results['cycle_metadata'].get(account_id, 'cycle'))
     
-    # Build graph
-    G, df = build_graph(csv_path)
+    if account_id in results['smurfing_nodes']:
+        detected_patterns.append(results['smurfing_metadata'].get(account_id, 'smurfing'))
     
-    # Prune isolated nodes
-    G = prune_isolated_nodes(G)
+    if account_id in results['shell_nodes']:
+        detected_patterns.append(results['shell_metadata'].get(account_id, 'shell'))
     
-    # Run detection algorithms
-    results = detect_all_patterns(G, df)
+    if account_id in results['velocity_nodes']:
+        detected_patterns.append(results['velocity_metadata'].get(account_id, 'high_velocity'))
     
-    # Group rings with merging and deterministic sorting
-    ring_data = group_rings_by_pattern(results)
-    account_to_ring = ring_data['ring_assignments']
+    # Sort patterns alphabetically for deterministic order
+    detected_patterns.sort()
+    return detected_patterns
+
+def score_accounts(results, rings):
+    """
+    Score every flagged account and every ring member exactly once.
     
-    # Build suspicious_accounts list with STRICT DETERMINISTIC ORDERING
-    suspicious_accounts = []
-    all_suspicious_nodes = (
-        results['cycle_nodes'] | 
-        results['smurfing_nodes'] | 
+    Returns:
+        dict mapping account_id -> (suspicion_score, detected_patterns),
+        shared by suspicious_accounts and the fraud ring risk scores
+    """
+    accounts = (
+        results['cycle_nodes'] |
+        results['smurfing_nodes'] |
         results['shell_nodes'] |
         results['velocity_nodes']
     )
+    for ring_info in rings:
+        accounts.update(ring_info['members'])
     
-    # Sort nodes alphabetically FIRST for deterministic iteration
-    for account_id in sorted(all_suspicious_nodes):
-        detected_patterns = []
-        
-        # Add descriptive pattern names in DETERMINISTIC ORDER
-        if account_id in results['cycle_nodes']:
-            pattern_name = results['cycle_metadata'].get(account_id, 'cycle')
-            detected_patterns.append(pattern_name)
-        
-        if account_id in results['smurfing_nodes']:
-            pattern_name = results['smurfing_metadata'].get(account_id, 'smurfing')
-            detected_patterns.append(pattern_name)
-        
-        if account_id in results['shell_nodes']:
-            pattern_name = results['shell_metadata'].get(account_id, 'shell')
-            detected_patterns.append(pattern_name)
-        
-        if account_id in results['velocity_nodes']:
-            pattern_name = results['velocity_metadata'].get(account_id, 'high_velocity')
-            detected_patterns.append(pattern_name)
-        
-        # Sort patterns alphabetically for deterministic order
-        detected_patterns.sort()
-        
-        suspicion_score = calculate_suspicion_score(detected_patterns)
-        
+    account_scores = {}
+    for account_id in accounts:
+        detected_patterns = detected_patterns_for(account_id, results)
+        account_scores[account_id] = (calculate_suspicion_score(detected_patterns), detected_patterns)
+    return account_scores
+
+def build_suspicious_accounts(account_scores, account_to_ring):
+    """
+    Build the suspicious_accounts list from the shared account scores.
+    
+    Returns:
+        list of account entries with score > 50, sorted by score DESC
+        then account_id ASC
+    """
+    # Build suspicious_accounts list with STRICT DETERMINISTIC ORDERING
+    suspicious_accounts = []
+    for account_id, (suspicion_score, detected_patterns) in account_scores.items():
         # Only include accounts with score > 50
         if suspicion_score > 50:
             suspicious_accounts.append({
@@ -119,83 +115,471 @@ def main():
     
     # Sort by suspicion_score DESC, then by account_id ASC for tie-breaking
     suspicious_accounts.sort(key=lambda x: (-x['suspicion_score'], x['account_id']))
+    return suspicious_accounts
+
+def build_fraud_rings(ring_data, account_scores):
+    """
+    Build the fraud_rings list from grouped rings and the shared scores.
     
+    Returns:
+        list of ring entries in ring_id order
+    """
     # Build final fraud_rings output with STRICT DETERMINISTIC ORDERING
     fraud_rings_output = []
     for ring_info in ring_data['rings_by_pattern']:
-        ring_id = ring_info['ring_id']
         members = ring_info['members']  # Already sorted alphabetically in ring_grouper
-        pattern_type = ring_info['pattern_type']
         
-        # Calculate risk score as simple average of member suspicion scores
-        member_scores = []
-        for account_id in members:
-            # Find this account's suspicion_score from suspicious_accounts list
-            account_data = next((acc for acc in suspicious_accounts if acc['account_id'] == account_id), None)
-            if account_data:
-                member_scores.append(account_data['suspicion_score'])
-            else:
-                # If not in suspicious_accounts, calculate score
-                detected_patterns = []
-                
-                if account_id in results['cycle_nodes']:
-                    pattern_name = results['cycle_metadata'].get(account_id, 'cycle')
-                    detected_patterns.append(pattern_name)
-                
-                if account_id in results['smurfing_nodes']:
-                    pattern_name = results['smurfing_metadata'].get(account_id, 'smurfing')
-                    detected_patterns.append(pattern_name)
-                
-                if account_id in results['shell_nodes']:
-                    pattern_name = results['shell_metadata'].get(account_id, 'shell')
-                    detected_patterns.append(pattern_name)
-                
-                if account_id in results['velocity_nodes']:
-                    pattern_name = results['velocity_metadata'].get(account_id, 'high_velocity')
-                    detected_patterns.append(pattern_name)
-                
-                detected_patterns.sort()  # Deterministic pattern order
-                score = calculate_suspicion_score(detected_patterns)
-                member_scores.append(score)
-        
-        # Simple average: sum(member_scores) / len(member_scores)
+        # Simple average of member suspicion scores
         # No multipliers, no structural weighting, no randomness
+        member_scores = [account_scores[account_id][0] for account_id in members]
         risk_score = format_float(sum(member_scores) / len(member_scores)) if member_scores else 0.0
         
         fraud_rings_output.append({
-            "ring_id": ring_id,
+            "ring_id": ring_info['ring_id'],
             "member_accounts": members,
-            "pattern_type": pattern_type,
+            "pattern_type": ring_info['pattern_type'],
             "risk_score": risk_score
         })
+    return fraud_rings_output
+
+def parse_args(argv=None):
+    """Parse command line options for the detection engine."""
+    parser = argparse.ArgumentParser(
+        description="MuleRift - Graph-based money muling detection engine"
+    )
+    parser.add_argument('csv_path', help="Transaction file to analyze: CSV, Parquet or Arrow IPC")
+    parser.add_argument(
+        '--hold-time',
+        choices=['pairwise', 'fifo'],
+        default='pairwise',
+        help="How detect_velocity measures receive-to-send time "
+             "(pairwise mean or FIFO fund matching)"
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help="Processes used to run the detectors (1 = sequential, 0 = all CPUs)"
+    )
+    parser.add_argument(
+        '--split',
+        choices=['components', 'detectors'],
+        default='components',
+        help="How work is divided across workers: connected-component work "
+             "units running every detector, or one task per detector"
+    )
+    parser.add_argument(
+        '--loader',
+        choices=['auto', 'light', 'pandas'],
+        default='auto',
+        help="CSV parser: the pandas-free csv loader, pandas, or auto "
+             "(light for small files, pandas for large ones)"
+    )
+    parser.add_argument(
+        '--from',
+        dest='time_from',
+        type=parse_time_bound,
+        metavar='TIMESTAMP',
+        help="Only analyze transactions at or after this ISO timestamp"
+    )
+    parser.add_argument(
+        '--to',
+        dest='time_to',
+        type=parse_time_bound,
+        metavar='TIMESTAMP',
+        help="Only analyze transactions before this ISO timestamp; on "
+             "Parquet both bounds skip row groups outside the range"
+    )
+    parser.add_argument(
+        '--store-dir',
+        help="Build the edge store out of core as memory-mapped files in "
+             "this directory, for CSVs larger than RAM"
+    )
+    parser.add_argument(
+        '--memory-budget',
+        type=float,
+        metavar='MB',
+        help="Peak memory target: sizes the --store-dir build chunks and "
+             "caps the edges per detection work unit"
+    )
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help="Reuse and store results in the content-addressed result cache "
+             "(off by default, so every run executes the full pipeline)"
+    )
+    parser.add_argument(
+        '--cache-dir',
+        help="Directory of the result cache; implies --cache "
+             "(default: $MULERIFT_CACHE_DIR, else $XDG_CACHE_HOME/mulerift "
+             "or ~/.cache/mulerift)"
+    )
+    parser.add_argument(
+        '--cache-max-mb',
+        type=float,
+        default=DEFAULT_CACHE_MAX_MB,
+        metavar='MB',
+        help="Size cap of the result cache; least recently used results are evicted"
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="Leave the result cache untouched even with --cache or --cache-dir"
+    )
+    parser.add_argument(
+        '--format',
+        choices=['json', 'ndjson'],
+        default='json',
+        help="Output format: one JSON document, or newline-delimited records "
+             "(one account or ring per line, then the summary)"
+    )
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help="Write the JSON without indentation or spaces"
+    )
+    parser.add_argument(
+        '--timings',
+        action='store_true',
+        help="Write per-stage timings (load, detection, ring grouping, "
+             "output assembly) as a JSON line to stderr"
+    )
+    parser.add_argument(
+        '--diagnostics',
+        choices=['output', 'stderr'],
+        help="Instrument every stage (wall and CPU time, peak memory, item "
+             "counts) and add the report to the output as a \"diagnostics\" "
+             "block, or write it as a JSON line to stderr"
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='DIR',
+        help="Profile every stage (each detector separately) and write "
+             "<stage>.pstats and flamegraph-ready <stage>.folded collapsed "
+             "stacks to DIR"
+    )
+    parser.add_argument(
+        '--hotspots',
+        type=int,
+        default=0,
+        metavar='N',
+        help="Count search work (expansions, pruned branches, time) per start "
+             "account in detect_cycles and detect_peel_chains and report the N "
+             "most expensive accounts with their degrees in the diagnostics "
+             "(stderr unless --diagnostics output)"
+    )
+    parser.add_argument(
+        '--no-trace-memory',
+        action='store_true',
+        help="With --diagnostics, skip tracemalloc: no peak memory, but "
+             "wall times without tracing overhead"
+    )
+    return parser.parse_args(argv)
+
+def analyze(csv_path, hold_time_mode='pairwise', workers=1, split='components', loader='auto',
+            store_dir=None, memory_budget_mb=None, time_range=None, cache=None, instrumentation=None):
+    """
+    Run the full detection pipeline on one transaction file.
+    
+    Shared by the command line and the persistent engine (server.py), so
+    both return the same contract.
+    
+    With store_dir the edges are built out of core into memory-mapped
+    files there (disk_store), without the DataFrame or the graph.
+    memory_budget_mb bounds the chunk sizes of that build and the size
+    of each detection work unit.
+    
+    time_range is an optional (start, end) pair of epoch seconds that
+    restricts the transactions analyzed (see load_transactions).
+    
+    With a ResultCache, the file bytes and the output-affecting
+    parameters are hashed first; a hit returns the stored output with a
+    fresh processing_time_seconds and skips the pipeline. Workers, split,
+    loader and store_dir do not change the output, so they are not part
+    of the key.
+    
+    With an Instrumentation, every stage (loading, pruning, each
+    detector, ring grouping, output assembly) is measured and the report
+    is added to the output as an optional top-level "diagnostics" block;
+    the contract fields are unchanged.
+    
+    Returns:
+        output: dict in the MuleRift JSON contract
+        timings: dict of per-stage seconds (load, detection, ring
+            grouping, output assembly)
+    """
+    start_time = time.time()
+    if instrumentation is None:
+        instrumentation = DISABLED
+    
+    try:
+        output, timings = _run_analysis(
+            csv_path, hold_time_mode, workers, split, loader, store_dir,
+            memory_budget_mb, time_range, cache, instrumentation, start_time
+        )
+    finally:
+        instrumentation.close()
+    
+    if instrumentation.enabled:
+        output["diagnostics"] = instrumentation.report()
+    return output, timings
+
+def _run_analysis(csv_path, hold_time_mode, workers, split, loader, store_dir,
+                  memory_budget_mb, time_range, cache, instrumentation, start_time):
+    """The pipeline behind analyze, with every stage instrumented."""
+    if cache is not None:
+        with instrumentation.stage('cache_lookup') as record:
+            key = cache_key(csv_path, {
+                "hold_time": hold_time_mode,
+                "time_range": list(time_range) if time_range else None
+            })
+            cached = cache.get(key)
+            record.count(hits=cached is not None)
+        if cached is not None:
+            cached["summary"]["processing_time_seconds"] = format_float(time.time() - start_time)
+            return cached, {"cache": "hit", "cache_seconds": round(time.time() - start_time, 4)}
+    
+    if store_dir and memory_budget_mb is None:
+        memory_budget_mb = DEFAULT_MEMORY_BUDGET_MB
+    
+    if store_dir:
+        # Stream the CSV into memory-mapped CSR files; pruning happens there
+        with instrumentation.stage('build_disk_store') as record:
+            store, features = build_disk_store(csv_path, store_dir, memory_budget_mb, time_range)
+            record.count(accounts=store.num_accounts, edges=store.num_edges)
+        total_accounts = store.num_accounts
+    else:
+        # Build graph
+        with instrumentation.stage('build_graph') as record:
+            G, transactions = build_graph(csv_path, loader, time_range)
+            record.count(transactions=len(transactions['timestamp']), nodes=G.number_of_nodes())
+            if instrumentation.enabled:
+                # Distinct pairs take a sort, so count them only on request
+                record.count(edges=G.number_of_edges())
+        
+        # Prune isolated nodes
+        with instrumentation.stage('prune_isolated_nodes') as record:
+            nodes_before = G.number_of_nodes()
+            G = prune_isolated_nodes(G)
+            record.count(nodes=G.number_of_nodes(), removed=nodes_before - G.number_of_nodes())
+        total_accounts = G.number_of_nodes()
+        
+        # Keep every transaction between the remaining accounts
+        with instrumentation.stage('build_edge_store') as record:
+            store = build_edge_store(G, transactions)
+            record.count(accounts=store.num_accounts, edges=store.num_edges)
+        
+        # Per-account features over all transactions, built once
+        with instrumentation.stage('build_account_features') as record:
+            features = build_account_features(G, transactions)
+            record.count(accounts=len(features))
+    
+    loaded = time.time()
+    
+    # Run detection algorithms
+    unit_edges = max_unit_edges(memory_budget_mb) if memory_budget_mb else None
+    if split == 'components' or unit_edges:
+        results = detect_all_patterns_by_component(
+            store,
+            features,
+            hold_time_mode=hold_time_mode,
+            workers=workers,
+            max_unit_edges=unit_edges,
+            instrumentation=instrumentation
+        )
+    else:
+        results = detect_all_patterns(
+            store,
+            features,
+            hold_time_mode=hold_time_mode,
+            workers=workers,
+            instrumentation=instrumentation
+        )
+    
+    detected = time.time()
+    
+    # Group rings with merging and deterministic sorting
+    with instrumentation.stage('group_rings_by_pattern') as record:
+        ring_data = group_rings_by_pattern(results)
+        account_to_ring = ring_data['ring_assignments']
+        record.count(rings=len(ring_data['rings_by_pattern']), accounts=len(account_to_ring))
+    
+    grouped = time.time()
+    
+    with instrumentation.stage('output_assembly') as record:
+        # Score each account once; suspicious_accounts and fraud_rings share it
+        account_scores = score_accounts(results, ring_data['rings_by_pattern'])
+        
+        suspicious_accounts = build_suspicious_accounts(account_scores, account_to_ring)
+        fraud_rings_output = build_fraud_rings(ring_data, account_scores)
+        record.count(
+            scored_accounts=len(account_scores),
+            suspicious_accounts=len(suspicious_accounts),
+            fraud_rings=len(fraud_rings_output)
+        )
     
     # Fraud rings already sorted by ring_id in ring_grouper (RING_001, RING_002, etc.)
     
-    processing_time = time.time() - start_time
+    assembled = time.time()
+    processing_time = assembled - start_time
+    
+    timings = {
+        "load_seconds": round(loaded - start_time, 4),
+        "detection_seconds": round(detected - loaded, 4),
+        "ring_grouping_seconds": round(grouped - detected, 4),
+        "assembly_seconds": round(assembled - grouped, 4)
+    }
     
     # Build final output matching MuleRift contract with STRICT ORDERING
     output = {
         "suspicious_accounts": suspicious_accounts,
         "fraud_rings": fraud_rings_output,
         "summary": {
-            "total_accounts_analyzed": G.number_of_nodes(),
+            "total_accounts_analyzed": total_accounts,
             "suspicious_accounts_flagged": len(suspicious_accounts),
             "fraud_rings_detected": len(fraud_rings_output),
             "processing_time_seconds": format_float(processing_time)
         }
     }
     
-    # Use custom JSON encoder with deterministic formatting
-    # sort_keys=True ensures consistent key ordering
-    # separators removes extra whitespace
-    json_str = json.dumps(
-        output, 
-        indent=2, 
-        ensure_ascii=False,
-        sort_keys=False,  # Keep our explicit key order
-        separators=(',', ': ')  # Consistent spacing
-    )
-    print(json_str)
+    if cache is not None:
+        cache.put(key, output)
+        timings["cache"] = "miss"
+    return output, timings
+
+def write_output(output, stream, compact=False):
+    """
+    Write the output contract to stream, one array element at a time.
+    
+    Gives the same text as one json.dumps(output, indent=2) call (or
+    separators=(',', ':') when compact) plus a newline, but never holds
+    the whole document as a single string, so the first accounts reach
+    the reader while later ones are still being encoded. Key order and
+    the 1-decimal floats come from the output dicts themselves.
+    """
+    if compact:
+        indent, item_separator, key_separator = None, ',', ':'
+    else:
+        indent, item_separator, key_separator = 2, ',', ': '
+    
+    def dumps(value, level):
+        text = json.dumps(
+            value,
+            indent=indent,
+            ensure_ascii=False,
+            sort_keys=False,  # Keep our explicit key order
+            separators=(item_separator, key_separator)
+        )
+        if indent is None:
+            return text
+        # Re-indent a nested value to its depth in the document
+        return text.replace('\n', '\n' + ' ' * (indent * level))
+    
+    def newline(level):
+        return '' if indent is None else '\n' + ' ' * (indent * level)
+    
+    stream.write('{')
+    for position, (key, value) in enumerate(output.items()):
+        if position:
+            stream.write(item_separator)
+        stream.write(newline(1) + json.dumps(key, ensure_ascii=False) + key_separator)
+        if not isinstance(value, list) or not value:
+            stream.write(dumps(value, 1))
+            continue
+        
+        # Stream arrays element by element
+        stream.write('[')
+        for index, item in enumerate(value):
+            if index:
+                stream.write(item_separator)
+            stream.write(newline(2) + dumps(item, 2))
+        stream.write(newline(1) + ']')
+    stream.write(newline(0) + '}\n')
+
+def write_ndjson(output, stream):
+    """
+    Write the output contract as newline-delimited JSON records.
+    
+    One {"type": "account", ...} line per suspicious account and one
+    {"type": "ring", ...} line per fraud ring, in contract order, then a
+    single {"type": "summary", ...} line, followed by a
+    {"type": "diagnostics", ...} line when the output has that block.
+    Each line parses on its own.
+    """
+    def write_record(record_type, entry):
+        record = {"type": record_type}
+        record.update(entry)
+        stream.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+    
+    for account in output['suspicious_accounts']:
+        write_record("account", account)
+    for ring in output['fraud_rings']:
+        write_record("ring", ring)
+    write_record("summary", output['summary'])
+    if "diagnostics" in output:
+        write_record("diagnostics", output['diagnostics'])
+
+def main():
+    """MuleRift - Graph-based money muling detection engine.
+    
+    Analyzes transaction CSV to detect:
+    - Circular Fund Routing (Cycles)
+    - Smurfing Patterns (Fan-in / Fan-out)
+    - Layered Shell Networks
+    """
+    if len(sys.argv) < 2:
+        print(json.dumps({"error": "Usage: python main.py <csv_path>"}), file=sys.stderr)
+        sys.exit(1)
+
+    args = parse_args()
+    time_range = None
+    if args.time_from is not None or args.time_to is not None:
+        time_range = (args.time_from, args.time_to)
+    cache = None
+    if (args.cache or args.cache_dir) and not args.no_cache:
+        try:
+            cache = ResultCache(args.cache_dir or DEFAULT_CACHE_DIR, args.cache_max_mb)
+        except OSError as e:
+            # A cache we cannot trust or create is skipped, not fatal
+            print(f"Result cache disabled: {e}", file=sys.stderr)
+    if args.hotspots and not args.diagnostics:
+        args.diagnostics = 'stderr'
+    instrumentation = None
+    if args.diagnostics or args.profile:
+        # Memory tracing only when diagnostics were asked for: profiling
+        # alone should not pay for tracemalloc
+        instrumentation = Instrumentation(
+            memory=bool(args.diagnostics) and not args.no_trace_memory,
+            profile_dir=args.profile,
+            hotspots=args.hotspots
+        )
+    output, timings = analyze(
+        args.csv_path,
+        hold_time_mode=args.hold_time,
+        workers=args.workers,
+        split=args.split,
+        loader=args.loader,
+        store_dir=args.store_dir,
+        memory_budget_mb=args.memory_budget,
+        time_range=time_range,
+        cache=cache,
+        instrumentation=instrumentation
+    )
+    
+    if args.timings:
+        # Stage timings go to stderr so the JSON contract on stdout is unchanged
+        print(json.dumps({"timings": timings}), file=sys.stderr)
+    if args.diagnostics == 'stderr':
+        print(json.dumps({"diagnostics": output.pop("diagnostics")}), file=sys.stderr)
+    elif args.diagnostics is None:
+        output.pop("diagnostics", None)
+    if args.profile:
+        instrumentation.write_profiles()
+    
+    if args.format == 'ndjson':
+        write_ndjson(output, sys.stdout)
+    else:
+        write_output(output, sys.stdout, compact=args.compact)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,68 @@
+import os
+import multiprocessing
+
+# (func, shared) for the pool currently running. Set before the workers are
+# forked, so every child inherits it through copy-on-write memory and only
+# the small per-task argument is pickled.
+_active = None
+
+def fork_available():
+    """Process pools need the fork start method to share inputs for free."""
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+def resolve_workers(workers):
+    """Map the --workers option to a process count (0 means all CPUs)."""
+    if workers is None or workers < 0:
+        return 1
+    if workers == 0:
+        return os.cpu_count() or 1
+    return workers
+
+def run_tasks(func, tasks, shared, workers=1, instrumentation=None):
+    """
+    Run func(shared, task) for every task, in a forked process pool.
+
+    shared holds the large read-only inputs (EdgeStore, feature table).
+    It is never pickled: the pool is forked after it is published, so the
+    workers read the parent's memory directly. Results come back in task
+    order, which keeps merged output identical to a sequential run. Falls
+    back to a sequential loop for one worker, a single task, or platforms
+    without fork.
+
+    When func records stages into an enabled instrumentation, each worker
+    starts every task from an empty copy and sends its records back with
+    the result, where they are merged into the parent's instrumentation.
+
+    Returns:
+        list of results, one per task, in task order
+    """
+    workers = min(resolve_workers(workers), len(tasks))
+    if workers <= 1 or not fork_available():
+        return [func(shared, task) for task in tasks]
+
+    if instrumentation is not None and not instrumentation.enabled:
+        instrumentation = None
+
+    global _active
+    _active = (func, shared, instrumentation)
+    try:
+        context = multiprocessing.get_context('fork')
+        with context.Pool(processes=workers) as pool:
+            results = pool.map(_run_task, tasks, chunksize=1)
+    finally:
+        _active = None
+
+    if instrumentation is None:
+        return results
+    for _, records in results:
+        instrumentation.merge(records)
+    return [result for result, _ in results]
+
+def _run_task(task):
+    func, shared, instrumentation = _active
+    if instrumentation is None:
+        return func(shared, task)
+    # This is the worker's own copy of the parent's instrumentation
+    instrumentation.reset()
+    result = func(shared, task)
+    return result, list(instrumentation.stages.values())
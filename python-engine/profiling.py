@@ -0,0 +1,133 @@
+"""
+Per-stage profiles for main.py --profile DIR.
+
+Every instrumented stage (see instrumentation.py) runs under cProfile and
+a CPU-time stack sampler. For each stage name two files are written:
+
+    <stage>.pstats   cProfile statistics (python -m pstats, snakeviz, ...)
+    <stage>.folded   collapsed stacks, one "frame;frame;frame weight" line
+                     per distinct stack, as flamegraph.pl, speedscope and
+                     inferno accept them; weights are CPU microseconds
+
+Directly recursive frames (dfs_cycles calling itself) are folded into
+one, so a deep search shows up as a single wide frame instead of a tower
+whose height depends on the path length.
+"""
+import os
+import time
+import signal
+import pstats
+import threading
+
+DEFAULT_SAMPLE_SECONDS = 0.001
+
+def frame_label(code):
+    """Collapsed-stack label of one code object."""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def fold_stack(frame):
+    """
+    Collapsed stack of frame, root first.
+
+    Returns:
+        ';'-joined labels, with runs of the same function folded to one
+    """
+    labels = []
+    while frame is not None:
+        label = frame_label(frame.f_code)
+        if not labels or labels[-1] != label:
+            labels.append(label)
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+class StackSampler:
+    """
+    SIGPROF-driven stack sampler.
+
+    Every interval of process CPU time the interrupted stack is folded and
+    added to each registered counter, so an enclosing stage also sees the
+    samples of the stages nested in it. Python runs signal handlers only
+    between bytecodes, so ticks that fire during one long C call arrive
+    as a single sample; each sample is therefore weighted by the CPU
+    microseconds since the previous one rather than counted once.
+
+    Needs setitimer and the main thread; elsewhere available() is False
+    and nothing is sampled.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_SECONDS):
+        self.interval = interval
+        self.counters = []
+        self._previous_handler = None
+        self._last_sample = 0.0
+
+    @staticmethod
+    def available():
+        return hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+
+    def add(self, counter):
+        """Start counting samples into counter (a collections.Counter)."""
+        if not self.counters:
+            self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+            self._last_sample = time.process_time()
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self.counters.append(counter)
+
+    def remove(self, counter):
+        """Stop counting into counter; the timer stops with the last one."""
+        self.counters.remove(counter)
+        if not self.counters:
+            self.stop()
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGPROF, self._previous_handler)
+            self._previous_handler = None
+        self.counters = []
+
+    def _sample(self, signum, frame):
+        now = time.process_time()
+        weight = max(1, int((now - self._last_sample) * 1e6))
+        self._last_sample = now
+        stack = fold_stack(frame)
+        for counter in self.counters:
+            counter[stack] += weight
+
+class _RawStats:
+    """Adapter that lets pstats.Stats load a cProfile stats dict directly."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+def write_stage_profile(directory, name, profile_stats, stack_samples):
+    """
+    Write one stage's files.
+
+    profile_stats is a list of cProfile stats dicts (one per call of the
+    stage, possibly from different worker processes), stack_samples a
+    Counter of folded stack -> CPU microseconds.
+
+    Returns:
+        list of the paths written
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+
+    if profile_stats:
+        stats = pstats.Stats(_RawStats(profile_stats[0]))
+        for extra in profile_stats[1:]:
+            stats.add(_RawStats(extra))
+        path = os.path.join(directory, f'{name}.pstats')
+        stats.dump_stats(path)
+        paths.append(path)
+
+    path = os.path.join(directory, f'{name}.folded')
+    with open(path, 'w') as handle:
+        for stack, count in sorted(stack_samples.items()):
+            handle.write(f'{stack} {count}\n')
+    paths.append(path)
+    return paths
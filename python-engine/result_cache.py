@@ -0,0 +1,133 @@
+"""
+On-disk cache of analysis results, keyed by content.
+
+The key is a SHA-256 over the input file's bytes, the parameters that
+change the output (hold-time mode, time range) and the engine's own
+source, so re-uploads of the same file hit regardless of name or path
+and any change to the detectors invalidates old entries. Entries are
+one JSON file each; a hit touches the file's mtime, and eviction removes
+the least recently used entries once the directory exceeds its size cap.
+
+Whoever can write the directory can plant results, so the default is
+per user ($XDG_CACHE_HOME/mulerift or ~/.cache/mulerift), created with
+mode 0700, and a directory owned by someone else or writable by group
+or others is refused (UntrustedCacheDir).
+"""
+import os
+import glob
+import json
+import hashlib
+import tempfile
+
+DEFAULT_CACHE_DIR = os.environ.get('MULERIFT_CACHE_DIR') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'mulerift'
+)
+DEFAULT_CACHE_MAX_MB = 256
+
+HASH_BLOCK_BYTES = 1 << 20
+
+class UntrustedCacheDir(OSError):
+    """The cache directory is not private to the current user."""
+
+def engine_version():
+    """Hash of the engine's Python sources; changes whenever any module does."""
+    digest = hashlib.sha256()
+    engine_dir = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(engine_dir, '*.py'))):
+        with open(path, 'rb') as handle:
+            digest.update(handle.read())
+    return digest.hexdigest()
+
+ENGINE_VERSION = engine_version()
+
+def cache_key(path, params):
+    """
+    Content address of one analysis.
+
+    Returns:
+        hex SHA-256 of the engine version, params and the file bytes
+    """
+    digest = hashlib.sha256()
+    digest.update(ENGINE_VERSION.encode('ascii'))
+    digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def check_private_dir(path):
+    """Raise UntrustedCacheDir unless path is owned by us and writable only by us."""
+    if not hasattr(os, 'getuid'):
+        return
+    stat = os.stat(path)
+    if stat.st_uid != os.getuid():
+        raise UntrustedCacheDir(f"Cache directory {path} is owned by another user")
+    if stat.st_mode & 0o022:
+        raise UntrustedCacheDir(f"Cache directory {path} is writable by group or others")
+
+class ResultCache:
+    """Directory of <key>.json result files with an LRU size cap."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_mb=DEFAULT_CACHE_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        check_private_dir(cache_dir)
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def get(self, key):
+        """
+        Look up a stored output.
+
+        Returns:
+            the decoded output dict, or None on a miss
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as handle:
+                output = json.load(handle)
+        except (FileNotFoundError, ValueError):
+            # Missing, or a torn entry from a crashed writer: recompute
+            return None
+        try:
+            # Mark as most recently used
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return output
+
+    def put(self, key, output):
+        """Store an output, then evict least recently used entries over the cap."""
+        payload = json.dumps(output, ensure_ascii=False).encode('utf-8')
+        if len(payload) > self.max_bytes:
+            return
+
+        # Write to a temporary name and rename, so readers never see a partial entry
+        handle, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as temp:
+            temp.write(payload)
+        os.replace(temp_path, self.entry_path(key))
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits max_bytes."""
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, '*.json')):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -1,5 +1,63 @@
 from collections import defaultdict
 
+def find_root(parent, account):
+    """Find the union-find root of account, halving the path as it goes."""
+    while parent[account] != account:
+        parent[account] = parent[parent[account]]
+        account = parent[account]
+    return account
+
+def merge_rings_with_patterns(ring_groups, ring_patterns):
+    """
+    Merge rings that share common members, carrying their pattern types.
+    
+    Union-find over accounts (union by size, path halving): every ring
+    unions its members, so rings connected through shared accounts end up
+    under one root. The pattern set of a merged ring is the set of
+    patterns of the rings it absorbed. Near-linear in total ring size.
+    
+    Args:
+        ring_groups: list of member lists
+        ring_patterns: pattern type of each ring in ring_groups
+    
+    Returns:
+        merged: list of member sets
+        merged_patterns: list of contributing pattern sets (same order)
+    """
+    parent = {}
+    size = {}
+    
+    for ring in ring_groups:
+        for member in ring:
+            if member not in parent:
+                parent[member] = member
+                size[member] = 1
+        
+        if not ring:
+            continue
+        root = find_root(parent, ring[0])
+        for member in ring[1:]:
+            other = find_root(parent, member)
+            if other == root:
+                continue
+            if size[other] > size[root]:
+                root, other = other, root
+            parent[other] = root
+            size[root] += size[other]
+    
+    members_by_root = {}
+    for account in parent:
+        members_by_root.setdefault(find_root(parent, account), set()).add(account)
+    
+    patterns_by_root = {root: set() for root in members_by_root}
+    for ring, pattern in zip(ring_groups, ring_patterns):
+        if ring:
+            patterns_by_root[find_root(parent, ring[0])].add(pattern)
+    
+    merged = list(members_by_root.values())
+    merged_patterns = [patterns_by_root[root] for root in members_by_root]
+    return merged, merged_patterns
+
 def merge_overlapping_rings(ring_groups):
     """
     Merge rings that share common members.
@@ -7,27 +65,7 @@ def merge_overlapping_rings(ring_groups):
     If a node is a 'Collector' in a Fan-In and also a 'Participant' in a Cycle,
     merge all involved accounts into one single Ring.
     """
-    if not ring_groups:
-        return []
-    
-    # Convert to sets for easier merging
-    ring_sets = [set(ring) for ring in ring_groups]
-    
-    # Merge overlapping sets
-    merged = []
-    while ring_sets:
-        current = ring_sets.pop(0)
-        
-        # Check for overlaps with remaining rings
-        i = 0
-        while i < len(ring_sets):
-            if current & ring_sets[i]:  # If there's overlap
-                current = current | ring_sets.pop(i)  # Merge
-            else:
-                i += 1
-        
-        merged.append(current)
-    
+    merged, _ = merge_rings_with_patterns(ring_groups, [None] * len(ring_groups))
     return merged
 
 def deterministic_sort_rings(ring_sets):
@@ -91,43 +129,34 @@ def group_rings_by_pattern(results):
             - rings_by_pattern: list of rings with pattern_type
     """
     all_rings = []
-    pattern_map = {}  # Track which pattern each ring belongs to
+    ring_patterns = []  # Track which pattern each ring belongs to
     
     # Collect all rings with their pattern types
     for cycle_group in results.get('cycle_groups', []):
-        ring_id = len(all_rings)
         all_rings.append(cycle_group)
-        pattern_map[ring_id] = 'cycle'
+        ring_patterns.append('cycle')
     
     for smurfing_group in results.get('smurfing_groups', []):
-        ring_id = len(all_rings)
         all_rings.append(smurfing_group)
-        pattern_map[ring_id] = 'smurfing'
+        ring_patterns.append('smurfing')
     
     for shell_group in results.get('shell_groups', []):
-        ring_id = len(all_rings)
         all_rings.append(shell_group)
-        pattern_map[ring_id] = 'shell_layering'
-    
-    # Merge overlapping rings
-    merged_rings = merge_overlapping_rings(all_rings)
-    
-    # Determine pattern type for merged rings
-    merged_pattern_map = {}
-    for idx, merged_ring in enumerate(merged_rings):
-        # Find which original rings contributed to this merged ring
-        contributing_patterns = set()
-        for orig_idx, orig_ring in enumerate(all_rings):
-            if set(orig_ring) & merged_ring:  # If overlap
-                contributing_patterns.add(pattern_map[orig_idx])
-        
-        # Priority: cycle > smurfing > shell_layering
+        ring_patterns.append('shell_layering')
+    
+    # Merge overlapping rings, keeping the patterns that contributed
+    merged_rings, merged_patterns = merge_rings_with_patterns(all_rings, ring_patterns)
+    
+    # Priority: cycle > smurfing > shell_layering, keyed by smallest member
+    pattern_by_first_member = {}
+    for merged_ring, contributing_patterns in zip(merged_rings, merged_patterns):
         if 'cycle' in contributing_patterns:
-            merged_pattern_map[idx] = 'cycle'
+            pattern_type = 'cycle'
         elif 'smurfing' in contributing_patterns:
-            merged_pattern_map[idx] = 'smurfing'
+            pattern_type = 'smurfing'
         else:
-            merged_pattern_map[idx] = 'shell_layering'
+            pattern_type = 'shell_layering'
+        pattern_by_first_member[min(merged_ring)] = pattern_type
     
     # Apply deterministic sorting
     sorted_rings = deterministic_sort_rings(merged_rings)
@@ -137,11 +166,11 @@ def group_rings_by_pattern(results):
     
     # Add pattern types to ring_list
     rings_by_pattern = []
-    for idx, ring_info in enumerate(ring_list):
+    for ring_info in ring_list:
         rings_by_pattern.append({
             'ring_id': ring_info['ring_id'],
             'members': ring_info['members'],
-            'pattern_type': merged_pattern_map.get(idx, 'unknown')
+            'pattern_type': pattern_by_first_member[ring_info['members'][0]]
         })
     
     return {
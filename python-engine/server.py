@@ -0,0 +1,145 @@
+"""
+Persistent MuleRift engine.
+
+Imports pandas, numpy and the detectors once, then answers
+analysis jobs over stdin/stdout until stdin closes. Every message is a
+frame: a 4-byte big-endian length followed by that many bytes of UTF-8
+JSON.
+
+    request:  {"id": 7, "csv_path": "...", "hold_time": "pairwise",
+               "workers": 1, "split": "components", "loader": "auto",
+               "from": "2024-01-01", "to": "2024-02-01", "cache": true,
+               "diagnostics": false, "profile_dir": null,
+               "hotspots": 0}
+    response: {"id": 7, "output": {...MuleRift JSON contract...}}
+              {"id": 7, "error": "..."}
+
+Results go through the on-disk result cache (result_cache.py) unless the
+request sets "cache": false; MULERIFT_CACHE_DIR and MULERIFT_CACHE_MAX_MB
+configure it. A cache directory that is not private to this user is
+refused and the engine runs uncached. With "diagnostics": true the output carries the
+instrumentation report (see instrumentation.py), including the "hotspots"
+most expensive accounts per search detector; with "profile_dir" the
+per-stage profiles are written there (see profiling.py).
+
+On startup the engine writes one frame {"ready": true, "pid": ...,
+"startup_seconds": ...} once the imports are done.
+"""
+import time
+
+start_time = time.time()
+
+import os
+import sys
+import json
+import struct
+from main import analyze
+from graph_builder import parse_time_bound
+from instrumentation import Instrumentation
+from result_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB, ResultCache
+
+FRAME_HEADER = struct.Struct('>I')
+
+def read_frame(stream):
+    """
+    Read one frame from a binary stream.
+
+    Returns:
+        decoded JSON payload, or None at end of stream
+    """
+    header = stream.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+    (length,) = FRAME_HEADER.unpack(header)
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return json.loads(payload.decode('utf-8'))
+
+def write_frame(stream, message):
+    """Write one JSON message as a frame and flush it."""
+    payload = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    stream.write(FRAME_HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+def handle_request(request, cache=None):
+    """
+    Run one analysis job, through cache unless the request opts out.
+
+    Returns:
+        response message with the output contract or an error
+    """
+    response = {"id": request.get("id")}
+    instrumentation = None
+    if request.get('diagnostics') or request.get('profile_dir'):
+        instrumentation = Instrumentation(
+            memory=bool(request.get('diagnostics')),
+            profile_dir=request.get('profile_dir'),
+            hotspots=request.get('hotspots', 0)
+        )
+    try:
+        time_range = None
+        if request.get('from') or request.get('to'):
+            time_range = tuple(
+                parse_time_bound(request[key]) if request.get(key) else None
+                for key in ('from', 'to')
+            )
+        output, timings = analyze(
+            request['csv_path'],
+            hold_time_mode=request.get('hold_time', 'pairwise'),
+            workers=request.get('workers', 1),
+            split=request.get('split', 'components'),
+            loader=request.get('loader', 'auto'),
+            store_dir=request.get('store_dir'),
+            memory_budget_mb=request.get('memory_budget_mb'),
+            time_range=time_range,
+            cache=cache if request.get('cache', True) else None,
+            instrumentation=instrumentation
+        )
+        if instrumentation is not None and instrumentation.profile_dir:
+            instrumentation.write_profiles()
+    except Exception as e:
+        response["error"] = f"{type(e).__name__}: {e}"
+        return response
+
+    if not request.get('diagnostics'):
+        output.pop("diagnostics", None)
+    response["output"] = output
+    response["timings"] = timings
+    return response
+
+def serve(requests, responses, cache=None):
+    """Answer framed requests until the request stream closes."""
+    write_frame(responses, {
+        "ready": True,
+        "pid": os.getpid(),
+        "startup_seconds": round(time.time() - start_time, 4)
+    })
+    while True:
+        try:
+            request = read_frame(requests)
+        except ValueError as e:
+            # Undecodable payload: the framing itself is still intact
+            write_frame(responses, {"id": None, "error": f"Invalid request: {e}"})
+            continue
+        if request is None:
+            return
+        write_frame(responses, handle_request(request, cache))
+
+def main():
+    """Serve jobs on stdin/stdout; stray prints go to stderr, not the frames."""
+    requests = sys.stdin.buffer
+    responses = sys.stdout.buffer
+    sys.stdout = sys.stderr
+    try:
+        cache = ResultCache(
+            DEFAULT_CACHE_DIR,
+            float(os.environ.get('MULERIFT_CACHE_MAX_MB', DEFAULT_CACHE_MAX_MB))
+        )
+    except OSError as e:
+        print(f"Result cache disabled: {e}", file=sys.stderr)
+        cache = None
+    serve(requests, responses, cache)
+
+if __name__ == "__main__":
+    main()
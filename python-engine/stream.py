@@ -0,0 +1,489 @@
+import sys
+import csv
+import json
+import time
+import heapq
+import argparse
+from collections import defaultdict
+import numpy as np
+from edge_store import EdgeStore
+from account_features import AccountFeatures
+from graph_builder import read_transaction_records
+from detectors import (
+    detect_cycles, find_fan_bursts, smurfing_results, detect_velocity, detect_peel_chains
+)
+from ring_grouper import group_rings_by_pattern
+from main import score_accounts, build_suspicious_accounts, build_fraud_rings
+
+class TransactionWindow:
+    """
+    Sliding window over the most recent transactions.
+
+    Every detector works on transactions at most 72 hours apart, so only
+    transactions within horizon_hours of the latest one seen are kept.
+    Older ones expire. Accounts are pruned like prune_isolated_nodes: an
+    account is kept while it both sends and receives inside the window.
+
+    The account features used by the detectors (transaction count, first
+    and last seen) cover every accepted transaction, like
+    build_account_features does for a whole CSV.
+    """
+
+    def __init__(self, horizon_hours=72):
+        self.horizon_seconds = int(horizon_hours * 3600)
+        self.latest = None
+        self.next_seq = 0
+        self.edges = {}                  # seq -> (sender, receiver, amount, timestamp)
+        self.expiry = []                 # heap of (timestamp, seq)
+        self.out_edges = {}              # account -> seqs it sent
+        self.in_edges = {}               # account -> seqs it received
+        self.kept = set()
+
+        # Lifetime features
+        self.txn_count = defaultdict(int)
+        self.first_seen = {}
+        self.last_seen = {}
+
+    def add(self, transactions):
+        """
+        Add a batch of transactions and expire the ones that left the window.
+
+        transactions holds the column arrays of load_transactions (see
+        read_transaction_records). Transactions already older than the
+        window are dropped as late. Edges are numbered in arrival order,
+        which plays the role of the CSV row index.
+
+        Returns:
+            touched: accounts with a transaction added or expired, plus the
+                neighbours of accounts that were pruned or restored
+            counts: dict with added, expired and late transaction counts
+        """
+        senders = transactions['sender_id'].tolist()
+        receivers = transactions['receiver_id'].tolist()
+        amounts = transactions['amount'].tolist()
+        timestamps = transactions['timestamp'].tolist()
+
+        if timestamps:
+            batch_latest = max(timestamps)
+            self.latest = batch_latest if self.latest is None else max(self.latest, batch_latest)
+        if self.latest is None:
+            return set(), {'added': 0, 'expired': 0, 'late': 0}
+        cutoff = self.latest - self.horizon_seconds
+
+        touched = set()
+        added = late = 0
+        for sender, receiver, amount, timestamp in zip(senders, receivers, amounts, timestamps):
+            if timestamp < cutoff:
+                late += 1
+                continue
+
+            seq = self.next_seq
+            self.next_seq += 1
+            self.edges[seq] = (sender, receiver, amount, timestamp)
+            heapq.heappush(self.expiry, (timestamp, seq))
+            self.out_edges.setdefault(sender, set()).add(seq)
+            self.in_edges.setdefault(receiver, set()).add(seq)
+            touched.update((sender, receiver))
+            added += 1
+
+            # A transfer to itself is one transaction, not two
+            self.txn_count[sender] += 1
+            if receiver != sender:
+                self.txn_count[receiver] += 1
+            for account in (sender, receiver):
+                self.first_seen[account] = min(self.first_seen.get(account, timestamp), timestamp)
+                self.last_seen[account] = max(self.last_seen.get(account, timestamp), timestamp)
+
+        # Expire everything that can no longer share a window with the latest edge
+        expired = 0
+        while self.expiry and self.expiry[0][0] < cutoff:
+            _, seq = heapq.heappop(self.expiry)
+            sender, receiver, _, _ = self.edges.pop(seq)
+            _discard(self.out_edges, sender, seq)
+            _discard(self.in_edges, receiver, seq)
+            touched.update((sender, receiver))
+            expired += 1
+
+        # Accounts that were pruned or restored add or drop edges of their neighbours
+        for account in list(touched):
+            is_kept = account in self.out_edges and account in self.in_edges
+            if is_kept != (account in self.kept):
+                if is_kept:
+                    self.kept.add(account)
+                else:
+                    self.kept.discard(account)
+                touched.update(self.neighbors(account))
+
+        return touched, {'added': added, 'expired': expired, 'late': late}
+
+    def neighbors(self, account):
+        """Accounts sharing a window transaction with account, either direction."""
+        for seq in self.out_edges.get(account, ()):
+            yield self.edges[seq][1]
+        for seq in self.in_edges.get(account, ()):
+            yield self.edges[seq][0]
+
+    def reachable(self, seeds, radius=None):
+        """
+        Kept accounts within radius undirected hops of the kept seeds.
+
+        Only edges between kept accounts are followed, like the EdgeStore
+        of a pruned graph. radius=None returns the whole weakly connected
+        components of the seeds.
+        """
+        found = {account for account in seeds if account in self.kept}
+        frontier = list(found)
+        hops = 0
+        while frontier and (radius is None or hops < radius):
+            next_frontier = []
+            for account in frontier:
+                for peer in self.neighbors(account):
+                    if peer in self.kept and peer not in found:
+                        found.add(peer)
+                        next_frontier.append(peer)
+            frontier = next_frontier
+            hops += 1
+        return found
+
+    def edge_store(self, accounts):
+        """EdgeStore of the window transactions between the given kept accounts."""
+        accounts = sorted(accounts)
+        index = {account: i for i, account in enumerate(accounts)}
+        senders, receivers, amounts, timestamps, seqs = [], [], [], [], []
+        for i, account in enumerate(accounts):
+            for seq in self.out_edges.get(account, ()):
+                _, receiver, amount, timestamp = self.edges[seq]
+                j = index.get(receiver)
+                if j is None:
+                    continue
+                senders.append(i)
+                receivers.append(j)
+                amounts.append(amount)
+                timestamps.append(timestamp)
+                seqs.append(seq)
+        return EdgeStore(accounts, senders, receivers, amounts, timestamps, seqs)
+
+    def features(self, accounts):
+        """Feature table (as build_account_features) for the given accounts."""
+        return AccountFeatures(
+            accounts,
+            txn_count=np.array([self.txn_count[account] for account in accounts], dtype=np.int64),
+            first_seen=np.array([self.first_seen[account] for account in accounts], dtype=np.int64),
+            last_seen=np.array([self.last_seen[account] for account in accounts], dtype=np.int64)
+        )
+
+def _discard(edges_by_account, account, seq):
+    """Remove one edge from an account's edge set, dropping empty sets."""
+    seqs = edges_by_account[account]
+    seqs.discard(seq)
+    if not seqs:
+        del edges_by_account[account]
+
+class IncrementalDetector:
+    """
+    Keeps detection results up to date as transaction batches arrive.
+
+    Only findings that a batch can change are recomputed:
+    - cycles, fan windows and velocity for the touched accounts, on the
+      accounts within two hops of them (a cycle of at most five accounts
+      never strays further from any of its members)
+    - shell chains through the touched accounts, on the accounts within
+      six hops of them. Every maximal chain is reported on its own, and
+      whether it is one depends only on its members' edges and features
+      (source degree, ghost status, relay velocity, an edge extending it
+      from its last account), so a chain without a touched member is
+      unchanged. A chain spans at most six accounts, so its members lie
+      within five hops of a touched one and their edges within six.
+
+    Every other finding is kept as is. The reassembled results are the
+    same as running detect_all_patterns on the pruned window.
+    """
+
+    def __init__(self, horizon_hours=72, hold_time_mode='pairwise'):
+        self.window = TransactionWindow(horizon_hours)
+        self.hold_time_mode = hold_time_mode
+        self.cycles = {}      # frozenset of members -> cycle starting at its smallest account
+        self.fan_in = {}      # collector -> burst senders
+        self.fan_out = {}     # disperser -> burst receivers
+        self.velocity = set()
+        self.chains = []      # shell chain paths
+        self.accounts = {}    # account_id -> last emitted suspicious account entry
+        self.rings = {}       # smallest member -> last emitted fraud ring entry
+        self.batches = 0
+
+    def update(self, transactions):
+        """
+        Apply one batch of transactions and recompute the affected findings.
+
+        Returns:
+            dict with added, expired and late transaction counts
+        """
+        touched, counts = self.window.add(transactions)
+
+        # Drop every finding anchored on a touched account
+        self.cycles = {
+            members: cycle for members, cycle in self.cycles.items()
+            if members.isdisjoint(touched)
+        }
+        self.fan_in = {hub: burst for hub, burst in self.fan_in.items() if hub not in touched}
+        self.fan_out = {hub: burst for hub, burst in self.fan_out.items() if hub not in touched}
+        self.velocity -= touched
+
+        nearby = self.window.reachable(touched, radius=2)
+        if nearby:
+            store = self.window.edge_store(nearby)
+            features = self.window.features(store.accounts)
+
+            for cycle in detect_cycles(store)[1]:
+                if not touched.isdisjoint(cycle):
+                    self.cycles[frozenset(cycle)] = tuple(cycle)
+
+            fan_in, fan_out = find_fan_bursts(store, features)
+            self.fan_in.update((hub, burst) for hub, burst in fan_in.items() if hub in touched)
+            self.fan_out.update((hub, burst) for hub, burst in fan_out.items() if hub in touched)
+
+            velocity_nodes, _ = detect_velocity(store, hold_time_mode=self.hold_time_mode)
+            self.velocity |= velocity_nodes & touched
+
+        self.chains = [chain for chain in self.chains if touched.isdisjoint(chain)]
+        nearby = self.window.reachable(touched, radius=6)
+        if nearby:
+            store = self.window.edge_store(nearby)
+            features = self.window.features(store.accounts)
+            self.chains.extend(
+                tuple(chain) for chain in detect_peel_chains(store, features)[1]
+                if not touched.isdisjoint(chain)
+            )
+
+        return counts
+
+    def results(self):
+        """
+        Current findings in the detect_all_patterns result layout.
+
+        Groups are listed in sorted order, which is the order a full run
+        finds them in, so metadata for accounts in several groups matches.
+        """
+        cycle_groups = [list(cycle) for cycle in sorted(self.cycles.values())]
+        cycle_metadata = {}
+        for cycle in cycle_groups:
+            for n in cycle:
+                cycle_metadata[n] = f"cycle_length_{len(cycle)}"
+
+        smurfing_nodes, smurfing_groups, smurfing_metadata = smurfing_results(self.fan_in, self.fan_out)
+
+        # Nodes in several chains keep the longest length
+        peel_groups = [list(chain) for chain in sorted(self.chains)]
+        peel_metadata = {}
+        longest = {}
+        for chain in peel_groups:
+            for n in chain:
+                if len(chain) > longest.get(n, 0):
+                    longest[n] = len(chain)
+                    peel_metadata[n] = f"shell_hop_{len(chain)}"
+
+        return {
+            "cycle_nodes": set(cycle_metadata),
+            "cycle_groups": cycle_groups,
+            "cycle_metadata": cycle_metadata,
+            "smurfing_nodes": smurfing_nodes,
+            "smurfing_groups": smurfing_groups,
+            "smurfing_metadata": smurfing_metadata,
+            "velocity_nodes": set(self.velocity),
+            "velocity_metadata": {node: "high_velocity" for node in self.velocity},
+            "shell_nodes": set(peel_metadata),
+            "shell_groups": peel_groups,
+            "shell_metadata": peel_metadata
+        }
+
+    def snapshot(self):
+        """
+        Current suspicious_accounts and fraud_rings, as main.py reports them.
+
+        Returns:
+            suspicious_accounts: list of account entries
+            fraud_rings: list of ring entries
+        """
+        results = self.results()
+        ring_data = group_rings_by_pattern(results)
+        account_scores = score_accounts(results, ring_data['rings_by_pattern'])
+        suspicious_accounts = build_suspicious_accounts(account_scores, ring_data['ring_assignments'])
+        fraud_rings = build_fraud_rings(ring_data, account_scores)
+        return suspicious_accounts, fraud_rings
+
+    def process(self, transactions):
+        """
+        Apply one batch and report what changed since the previous batch.
+
+        Accounts are keyed by account_id and rings by their smallest
+        member. "removed" lists the entries as they were last emitted.
+
+        Returns:
+            delta dict for one output line
+        """
+        start_time = time.time()
+        counts = self.update(transactions)
+        suspicious_accounts, fraud_rings = self.snapshot()
+        self.batches += 1
+
+        accounts = {entry['account_id']: entry for entry in suspicious_accounts}
+        rings = {entry['member_accounts'][0]: entry for entry in fraud_rings}
+        delta = {
+            "batch": self.batches,
+            "transactions": dict(counts, in_window=len(self.window.edges)),
+            "suspicious_accounts": diff_entries(self.accounts, accounts),
+            "fraud_rings": diff_entries(self.rings, rings),
+            "summary": {
+                "total_accounts_analyzed": len(self.window.kept),
+                "suspicious_accounts_flagged": len(suspicious_accounts),
+                "fraud_rings_detected": len(fraud_rings),
+                "processing_time_seconds": round(time.time() - start_time, 4)
+            }
+        }
+        self.accounts = accounts
+        self.rings = rings
+        return delta
+
+def diff_entries(previous, current):
+    """Added, changed and removed entries between two keyed snapshots."""
+    return {
+        "added": [entry for key, entry in current.items() if key not in previous],
+        "changed": [
+            entry for key, entry in current.items()
+            if key in previous and previous[key] != entry
+        ],
+        "removed": [entry for key, entry in previous.items() if key not in current]
+    }
+
+def read_ndjson_batches(stream, batch_size=0):
+    """
+    Yield batches of transaction records from NDJSON lines.
+
+    Each line holds one transaction object or a list of them. A blank
+    line ends the current batch, as does reaching batch_size records
+    (0 = no limit) or the end of the stream.
+    """
+    batch = []
+    for line in iter(stream.readline, ''):
+        line = line.strip()
+        if not line:
+            if batch:
+                yield batch
+                batch = []
+            continue
+
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            print(json.dumps({"error": f"Invalid JSON line: {e}"}), file=sys.stderr)
+            continue
+        if isinstance(record, list):
+            batch.extend(record)
+        else:
+            batch.append(record)
+
+        if batch_size and len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def watch_csv_batches(csv_path, poll_seconds=1.0, batch_size=0):
+    """
+    Yield batches of rows appended to a transaction CSV.
+
+    The rows already in the file form the first batch(es); afterwards the
+    file is polled for newly appended complete lines. Runs until
+    interrupted.
+    """
+    with open(csv_path, newline='') as handle:
+        header = None
+        pending = ''
+        while True:
+            chunk = handle.read()
+            if not chunk:
+                time.sleep(poll_seconds)
+                continue
+
+            # Only complete lines are parsed; a partial last line waits
+            pending += chunk
+            lines = pending.split('\n')
+            pending = lines.pop()
+            rows = [row for row in csv.reader(lines) if row]
+            if header is None and rows:
+                header = rows.pop(0)
+
+            records = [dict(zip(header, row)) for row in rows]
+            step = batch_size or len(records)
+            for i in range(0, len(records), max(step, 1)):
+                yield records[i:i + step]
+
+def parse_args(argv=None):
+    """Parse command line options for the streaming engine."""
+    parser = argparse.ArgumentParser(
+        description="MuleRift - incremental detection over streamed transactions"
+    )
+    parser.add_argument(
+        '--watch',
+        metavar='CSV_PATH',
+        help="Follow a transaction CSV for appended rows instead of reading "
+             "NDJSON transactions from stdin"
+    )
+    parser.add_argument(
+        '--poll-seconds',
+        type=float,
+        default=1.0,
+        help="How often --watch checks the file for new rows"
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=0,
+        help="Flush a batch after this many transactions (0 = only on a "
+             "blank line, a poll, or end of input)"
+    )
+    parser.add_argument(
+        '--horizon-hours',
+        type=float,
+        default=72,
+        help="Transactions older than this, relative to the latest one, expire"
+    )
+    parser.add_argument(
+        '--hold-time',
+        choices=['pairwise', 'fifo'],
+        default='pairwise',
+        help="How detect_velocity measures receive-to-send time"
+    )
+    return parser.parse_args(argv)
+
+def main():
+    """MuleRift streaming mode.
+
+    Reads transaction batches from stdin (NDJSON) or a watched CSV, keeps
+    the detections up to date incrementally and writes one JSON line per
+    batch with the added, changed and removed suspicious accounts and
+    fraud rings.
+    """
+    args = parse_args()
+    detector = IncrementalDetector(args.horizon_hours, args.hold_time)
+
+    if args.watch:
+        batches = watch_csv_batches(args.watch, args.poll_seconds, args.batch_size)
+    else:
+        batches = read_ndjson_batches(sys.stdin, args.batch_size)
+
+    try:
+        for records in batches:
+            try:
+                transactions = read_transaction_records(records)
+            except (ValueError, TypeError) as e:
+                print(json.dumps({"error": f"Skipped batch: {e}"}), file=sys.stderr)
+                continue
+
+            delta = detector.process(transactions)
+            print(json.dumps(delta, ensure_ascii=False), flush=True)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
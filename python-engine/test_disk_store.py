@@ -0,0 +1,52 @@
+"""
+Check that the out-of-core store (--store-dir) gives the in-memory output.
+
+Runs as a script (python python-engine/test_disk_store.py) or under pytest.
+"""
+import os
+import json
+import tempfile
+from main import analyze
+
+HEADER = 'transaction_id,sender_id,receiver_id,amount,timestamp\n'
+
+def analyze_both(rows):
+    """
+    JSON outputs of the in-memory and the --store-dir pipeline for CSV
+    rows, compared as text so 7 and 7.0 differ.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'transactions.csv')
+        with open(csv_path, 'w') as handle:
+            handle.write(HEADER + ''.join(f'{row}\n' for row in rows))
+        outputs = []
+        for store_dir in (None, os.path.join(tmp, 'store')):
+            output, _ = analyze(csv_path, store_dir=store_dir)
+            del output['summary']['processing_time_seconds']
+            outputs.append(json.dumps(output))
+    return outputs
+
+def test_zero_padded_ids_are_one_account():
+    # pandas reads 007 and 7 as the same integer account
+    in_memory, on_disk = analyze_both([
+        'T1,007,8,100,2024-01-01 00:00:00',
+        'T2,8,9,90,2024-01-01 01:00:00',
+        'T3,9,7,80,2024-01-01 02:00:00'
+    ])
+    assert '"member_accounts": [7, 8, 9]' in in_memory
+    assert on_disk == in_memory
+
+def test_fractional_id_makes_every_id_a_float():
+    in_memory, on_disk = analyze_both([
+        'T1,7,8,100,2024-01-01 00:00:00',
+        'T2,8,9,90,2024-01-01 01:00:00',
+        'T3,9,7,80,2024-01-01 02:00:00',
+        'T4,1.5,2,10,2024-01-01 03:00:00'
+    ])
+    assert '"member_accounts": [7.0, 8.0, 9.0]' in in_memory
+    assert on_disk == in_memory
+
+if __name__ == '__main__':
+    test_zero_padded_ids_are_one_account()
+    test_fractional_id_makes_every_id_a_float()
+    print("✓ --store-dir output matches the in-memory pipeline")
@@ -0,0 +1,125 @@
+"""
+Check detect_peel_chains against a brute-force enumeration of the same rules.
+
+Runs as a script (python python-engine/test_peel_chains.py [graphs]) or
+under pytest.
+"""
+import sys
+import random
+from collections import defaultdict
+import numpy as np
+from account_graph import AccountGraph
+from graph_builder import intern_accounts, prune_isolated_nodes, build_edge_store, build_account_features
+from detectors import detect_peel_chains, ghost_accounts, intermediate_velocity_hours
+
+def build_inputs(rows):
+    """EdgeStore and features for (sender, receiver, amount cents, epoch seconds) rows."""
+    transactions = {
+        'transaction_id': np.array([f'T{i}' for i in range(len(rows))], dtype=object),
+        'sender_id': np.array([row[0] for row in rows], dtype=object),
+        'receiver_id': np.array([row[1] for row in rows], dtype=object),
+        'amount': np.array([row[2] for row in rows], dtype=np.int64),
+        'timestamp': np.array([row[3] for row in rows], dtype=np.int64)
+    }
+    G = AccountGraph(*intern_accounts(transactions['sender_id'], transactions['receiver_id']))
+    features = build_account_features(G, transactions)
+    store = build_edge_store(prune_isolated_nodes(G), transactions)
+    return store, features
+
+def brute_force_chains(store, features, min_length=3, max_length=6, time_window_hours=72, max_velocity_hours=24):
+    """
+    Every maximal peel chain, by enumerating all transaction sequences.
+
+    A sequence is a chain when it starts at a source, relays only through
+    ghost accounts with fast velocity, visits each account once, follows
+    (timestamp, txn_index) order with strictly decaying amounts and spans
+    at most the time window. It is maximal when no later transaction
+    extends a chain with the same last transaction and account path.
+
+    Returns:
+        set of account id tuples
+    """
+    can_relay = ghost_accounts(store, features) & ~(intermediate_velocity_hours(store) > max_velocity_hours)
+    out_degree = store.out_degrees()
+    is_source = (out_degree > 0) & (out_degree <= 5)
+    window_seconds = time_window_hours * 3600
+
+    senders = np.repeat(np.arange(store.num_accounts), np.diff(store.out_offsets))
+    order = np.lexsort((store.out_txn_index, store.out_timestamps))
+    edges = list(zip(
+        senders[order].tolist(), store.out_peers[order].tolist(),
+        store.out_amounts[order].tolist(), store.out_timestamps[order].tolist()
+    ))
+    edges_from = defaultdict(list)
+    for e, (u, v, _, _) in enumerate(edges):
+        edges_from[u].append(e)
+
+    states = set()
+    extended = set()
+
+    def walk(e, path, start):
+        states.add((e, path))
+        v = path[-1]
+        if len(path) >= max_length or not can_relay[v]:
+            return
+        for f in edges_from[v]:
+            _, w, amount, timestamp = edges[f]
+            if f > e and amount < edges[e][2] and timestamp - start <= window_seconds and w not in path:
+                extended.add((e, path))
+                walk(f, path + (w,), start)
+
+    for e, (u, v, _, timestamp) in enumerate(edges):
+        if is_source[u] and u != v:
+            walk(e, (u, v), timestamp)
+
+    return {
+        tuple(store.account_id(n) for n in path)
+        for e, path in states
+        if len(path) >= min_length and (e, path) not in extended
+    }
+
+def random_rows(rng, num_accounts, num_rows):
+    """Random transactions within a few days."""
+    accounts = [f'A{i:02d}' for i in range(num_accounts)]
+    rows = []
+    for _ in range(num_rows):
+        sender, receiver = rng.choice(accounts), rng.choice(accounts)
+        rows.append((sender, receiver, rng.randint(1, 20) * 100, rng.randint(0, 60) * 3600))
+    return rows
+
+def check_rows(rows):
+    store, features = build_inputs(rows)
+    peel_nodes, peel_groups, peel_metadata = detect_peel_chains(store, features)
+    expected = brute_force_chains(store, features)
+    found = [tuple(chain) for chain in peel_groups]
+    assert len(found) == len(set(found)), f"duplicate chains: {found}"
+    assert set(found) == expected, f"rows {rows}: got {sorted(found)}, expected {sorted(expected)}"
+    assert peel_nodes == {n for chain in expected for n in chain}
+    for n, pattern in peel_metadata.items():
+        assert pattern == f"shell_hop_{max(len(chain) for chain in expected if n in chain)}"
+
+def test_chains_sharing_an_edge_keep_every_source():
+    # A -> G1 and B -> G1 both continue through G1 -> G2; A's chain starts
+    # earlier than B's but is still valid
+    hour = 3600
+    rows = [
+        ('Z', 'A', 1000, 0), ('Z', 'B', 1000, hour),
+        ('A', 'G1', 100000, 2 * hour), ('B', 'G1', 100000, 3 * hour),
+        ('G1', 'G2', 90000, 4 * hour), ('G2', 'X', 80000, 5 * hour), ('X', 'Z', 70000, 6 * hour)
+    ]
+    store, features = build_inputs(rows)
+    _, peel_groups, peel_metadata = detect_peel_chains(store, features)
+    assert ['A', 'G1', 'G2', 'X', 'Z'] in peel_groups
+    assert peel_metadata['A'] == 'shell_hop_5'
+    check_rows(rows)
+
+def test_matches_brute_force_on_random_graphs(num_graphs=1000, seed=7):
+    rng = random.Random(seed)
+    for _ in range(num_graphs):
+        check_rows(random_rows(rng, rng.randint(4, 10), rng.randint(5, 25)))
+
+if __name__ == '__main__':
+    num_graphs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    test_chains_sharing_an_edge_keep_every_source()
+    test_matches_brute_force_on_random_graphs(num_graphs)
+    print(f"✓ detect_peel_chains matches brute force on {num_graphs} random graphs")
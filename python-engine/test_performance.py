@@ -99,11 +99,166 @@ def generate_large_test_data(num_transactions=12000, output_file='test_large.csv
     print(f"Generated {len(transactions)} transactions -> {output_file}")
     return output_file
 
+def benchmark_graph_construction(csv_path):
+    """Compare build_graph against the legacy row-by-row graph construction."""
+    import networkx as nx
+    from graph_builder import build_graph
+    
+    # Legacy construction: one add_edge call per df.iterrows() row
+    start = time.time()
+    df = pd.read_csv(csv_path)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    legacy = nx.DiGraph()
+    for _, row in df.iterrows():
+        legacy.add_edge(
+            row['sender_id'],
+            row['receiver_id'],
+            amount=float(row['amount']),
+            timestamp=row['timestamp'],
+            transaction_id=row['transaction_id']
+        )
+    legacy_elapsed = time.time() - start
+    
+    start = time.time()
+    G, _ = build_graph(csv_path)
+    bulk_elapsed = time.time() - start
+    
+    # build_graph interns ids and keeps no edge attributes, so compare structure
+    equivalent = (
+        [G.id_table[rank] for rank in G.nodes().tolist()] == sorted(legacy.nodes()) and
+        G.number_of_edges() == legacy.number_of_edges()
+    )
+    
+    print(f"\nGraph Construction (build_graph):")
+    print(f"  Legacy iterrows: {legacy_elapsed:.3f}s")
+    print(f"  Bulk columns:    {bulk_elapsed:.3f}s")
+    print(f"  Speedup:         {legacy_elapsed / max(bulk_elapsed, 1e-9):.1f}x")
+    print(f"  Equivalent graph: {'yes' if equivalent else 'NO'}")
+    return legacy_elapsed, bulk_elapsed
+
+def benchmark_edge_store_memory(csv_path):
+    """Compare the memory a networkx DiGraph would hold with the multi-edge EdgeStore."""
+    import tracemalloc
+    import networkx as nx
+    from graph_builder import build_graph, prune_isolated_nodes, build_edge_store
+    
+    G, df = build_graph(csv_path)
+    G = prune_isolated_nodes(G)
+    store = build_edge_store(G, df)
+    
+    # Measure the legacy DiGraph of the pruned accounts under tracemalloc
+    senders = store.edge_senders().tolist()
+    receivers = store.out_peers.tolist()
+    ids = store.accounts
+    tracemalloc.start()
+    legacy = nx.DiGraph()
+    legacy.add_edges_from((ids[s], ids[r]) for s, r in zip(senders, receivers))
+    graph_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    
+    print(f"\nEdge Storage (pruned graph):")
+    print(f"  DiGraph edges:   {legacy.number_of_edges()} ({graph_bytes / 1e6:.1f} MB)")
+    print(f"  EdgeStore edges: {store.num_edges} ({store.nbytes / 1e6:.1f} MB)")
+    return graph_bytes, store.nbytes
+
+def benchmark_loaders(csv_path):
+    """Compare import time and end-to-end latency of the light and pandas loaders."""
+    import os
+    import subprocess
+    
+    engine_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    def run_python(code):
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=engine_dir
+        )
+        return float(result.stdout.strip())
+    
+    # Import cost of each path, in a fresh interpreter
+    import_code = "import time; t = time.time(); import {module}; print(time.time() - t)"
+    light_import = run_python(import_code.format(module='main'))
+    pandas_import = run_python(import_code.format(module='main, pandas'))
+    
+    # Full command line run, interpreter startup included
+    latency = {}
+    for loader in ('light', 'pandas'):
+        start = time.time()
+        subprocess.run(
+            [sys.executable, os.path.join(engine_dir, 'main.py'), csv_path, '--loader', loader],
+            capture_output=True,
+            check=True
+        )
+        latency[loader] = time.time() - start
+    
+    print(f"\nCSV Loaders ({os.path.getsize(csv_path) / 1e6:.1f} MB):")
+    print(f"  Import (light path):  {light_import:.3f}s")
+    print(f"  Import (with pandas): {pandas_import:.3f}s")
+    print(f"  End-to-end light:     {latency['light']:.3f}s")
+    print(f"  End-to-end pandas:    {latency['pandas']:.3f}s")
+    return light_import, pandas_import, latency
+
+def benchmark_engine_latency(csv_path, requests=5):
+    """Compare a fresh main.py process per request with the persistent engine."""
+    import os
+    import subprocess
+    from server import read_frame, write_frame
+    
+    engine_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    # Cold: interpreter startup, imports and analysis on every request
+    cold = []
+    for _ in range(requests):
+        start = time.time()
+        subprocess.run(
+            [sys.executable, os.path.join(engine_dir, 'main.py'), csv_path],
+            capture_output=True,
+            check=True
+        )
+        cold.append(time.time() - start)
+    
+    # Warm: one engine process, started once, answering every request
+    start = time.time()
+    engine = subprocess.Popen(
+        [sys.executable, os.path.join(engine_dir, 'server.py')],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE
+    )
+    read_frame(engine.stdout)
+    startup = time.time() - start
+    
+    warm = []
+    for job_id in range(requests):
+        start = time.time()
+        # Uncached, so every request runs the analysis
+        write_frame(engine.stdin, {"id": job_id, "csv_path": csv_path, "cache": False})
+        read_frame(engine.stdout)
+        warm.append(time.time() - start)
+    engine.stdin.close()
+    engine.wait()
+    
+    cold_median = sorted(cold)[len(cold) // 2]
+    warm_median = sorted(warm)[len(warm) // 2]
+    print(f"\nRequest Latency ({requests} requests, median):")
+    print(f"  Cold (spawn main.py):   {cold_median:.3f}s")
+    print(f"  Engine startup (once):  {startup:.3f}s")
+    print(f"  Warm (engine request):  {warm_median:.3f}s")
+    print(f"  Speedup:                {cold_median / max(warm_median, 1e-9):.1f}x")
+    return cold_median, startup, warm_median
+
 if __name__ == "__main__":
     # Generate test data
     num_txns = 12000 if len(sys.argv) < 2 else int(sys.argv[1])
     test_file = generate_large_test_data(num_txns)
     
+    benchmark_graph_construction(test_file)
+    benchmark_edge_store_memory(test_file)
+    benchmark_loaders(test_file)
+    benchmark_engine_latency(test_file)
+    
     # Run analysis
     print(f"\nRunning fraud detection on {num_txns} transactions...")
     start = time.time()